@@ -0,0 +1,509 @@
+"""
+Markdown 笔记本（notepad.py）与视频平台（video/app.py）的可复现基准测试
+
+三种驱动方式：
+  - 默认用 Flask test client 在进程内直接调用真实路由
+  - --http 时在子进程中启动 werkzeug 服务器，再用多个进程并发发起 HTTP 请求
+  - --startup 时反复启动全新的解释器，测量导入、create_app() 和首个请求的耗时
+
+用法示例：
+  python benchmark.py --app notepad --users 50 --notes 2000 --requests 300 --output notepad.json
+  python benchmark.py --app video --http --processes 4 --duration 10 --output video.json
+  python benchmark.py --app notepad --startup --runs 10 --budget-ms 800
+
+每次运行都在临时目录中按固定随机种子生成数据，结果（p50/p99 延迟、吞吐量、峰值内存）
+写入 JSON，便于在 CI 中对比不同提交。
+"""
+import argparse
+import http.cookiejar
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块
+    resource = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+PASSWORD = 'benchmark-password'
+VIDEO_SIZES = (64 * 1024, 1024 * 1024, 8 * 1024 * 1024)
+
+# ----------------------------------
+# 导入被测应用并通过 create_app() 创建实例（数据库和上传目录通过 FLASK_ 环境变量指向临时目录）
+# ----------------------------------
+def configure_env(workdir):
+    os.environ['FLASK_SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['FLASK_UPLOAD_FOLDER'] = os.path.join(workdir, 'uploads')
+    os.environ['FLASK_SESSION_SQLITE_PATH'] = os.path.join(workdir, 'sessions.db')
+
+def load_app(app_name):
+    if app_name == 'notepad':
+        sys.path.insert(0, ROOT)
+        import notepad as module
+    else:
+        sys.path.insert(0, os.path.join(ROOT, 'video'))
+        import app as module
+    return module
+
+# ----------------------------------
+# 合成数据
+# ----------------------------------
+WORDS = ('flask sqlalchemy markdown note video cache index query render session python '
+         'latency throughput profile block table math code search public private').split()
+
+def make_paragraph(rng, sentences=4):
+    return ' '.join(' '.join(rng.choice(WORDS) for _ in range(rng.randint(6, 14))).capitalize() + '.'
+                    for _ in range(sentences))
+
+def make_markdown(rng, sections):
+    """生成包含标题、列表、代码块、表格和公式的 Markdown 文本"""
+    parts = []
+    for i in range(sections):
+        parts.append(f'## Section {i + 1}\n')
+        parts.append(make_paragraph(rng) + '\n')
+        kind = rng.randrange(4)
+        if kind == 0:
+            body = '\n'.join(f'    result_{j} = compute({j}, "{rng.choice(WORDS)}")' for j in range(rng.randint(3, 12)))
+            parts.append('```python\ndef example():\n' + body + '\n    return result_0\n```\n')
+        elif kind == 1:
+            rows = '\n'.join(f'| {rng.choice(WORDS)} | {rng.randint(0, 999)} | {rng.random():.3f} |'
+                             for _ in range(rng.randint(3, 10)))
+            parts.append('| name | count | ratio |\n|------|-------|-------|\n' + rows + '\n')
+        elif kind == 2:
+            parts.append('$$\n\\sum_{i=1}^{n} x_i^2 = \\int_0^1 f(t)\\,dt\n$$\n')
+        else:
+            parts.append('\n'.join(f'- {make_paragraph(rng, 1)}' for _ in range(rng.randint(2, 6))) + '\n')
+    return '\n'.join(parts)
+
+def seed_notepad(module, app, rng, users, notes, sections):
+    from werkzeug.security import generate_password_hash
+    password_hash = generate_password_hash(PASSWORD)  # 所有用户共用一个哈希，避免播种耗时
+    with app.app_context():
+        module.init_db()
+        user_objs = [module.User(username=f'user{i}', password_hash=password_hash) for i in range(users)]
+        module.db.session.add_all(user_objs)
+        module.db.session.flush()
+        note_objs = []
+        for i in range(notes):
+            owner = user_objs[i % users]
+            note_objs.append(module.Note(title=f'Note {i}', content=make_markdown(rng, rng.randint(2, sections)),
+                                         user_id=owner.id, is_public=(i % 2 == 0)))
+        module.db.session.add_all(note_objs)
+        module.db.session.commit()
+        return {
+            'users': [(u.id, u.username) for u in user_objs],
+            'notes': [(n.id, n.user_id, n.is_public) for n in note_objs],
+        }
+
+def seed_video(module, app, rng, users, videos):
+    from werkzeug.security import generate_password_hash
+    password_hash = generate_password_hash(PASSWORD, method='pbkdf2:sha256', salt_length=16)
+    with app.app_context():
+        module.init_db()
+        user_objs = [module.User(username=f'user{i}', password_hash=password_hash) for i in range(users)]
+        module.db.session.add_all(user_objs)
+        module.db.session.flush()
+        video_objs = []
+        for i in range(videos):
+            owner = user_objs[i % users]
+            size = VIDEO_SIZES[i % len(VIDEO_SIZES)]
+            filename = f'video{i}.mp4'
+            app.extensions['storage'].put(module.video_key(owner.username, filename), io.BytesIO(rng.randbytes(size)))
+            video_objs.append(module.Video(filename=filename, title=f'Video {i}', visible=True, user_id=owner.id))
+        module.db.session.add_all(video_objs)
+        module.db.session.commit()
+        return {
+            'users': [(u.id, u.username) for u in user_objs],
+            'videos': [(v.id, v.user_id, v.filename, VIDEO_SIZES[i % len(VIDEO_SIZES)])
+                       for i, v in enumerate(video_objs)],
+        }
+
+# ----------------------------------
+# 场景：每个场景是 (名称, 方法, 路径, 请求体, 请求头) 的生成函数
+# ----------------------------------
+def form(data):
+    return urllib.parse.urlencode(data).encode(), {'Content-Type': 'application/x-www-form-urlencoded'}
+
+def multipart(fields, files):
+    boundary = '----benchmark' + os.urandom(8).hex()
+    lines = []
+    for name, value in fields.items():
+        lines.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, content) in files.items():
+        lines.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: application/octet-stream\r\n\r\n'.encode() + content + b'\r\n')
+    lines.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(lines), {'Content-Type': f'multipart/form-data; boundary={boundary}'}
+
+def notepad_scenarios(dataset, rng):
+    """当前登录用户为 user0"""
+    user_ids = dict(dataset['users'])
+    own = [n for n in dataset['notes'] if n[1] == dataset['users'][0][0]]
+    others = [n for n in dataset['notes'] if n[1] != dataset['users'][0][0] and n[2]]
+
+    def view_note():
+        return 'GET', f'/notes/{rng.choice(own)[0]}', None, {}
+
+    def view_others_note():
+        note_id, user_id, _ = rng.choice(others)
+        return 'GET', f'/users/{user_id}/notes/{note_id}', None, {}
+
+    def search():
+        name = user_ids[rng.choice(others)[1]]
+        body, headers = form({'username': name[:rng.randint(2, len(name))]})
+        return 'POST', '/search', body, headers
+
+    def list_notes():
+        return 'GET', '/notes', None, {}
+
+    scenarios = {'list_notes': list_notes, 'view_note': view_note, 'search': search}
+    if others:
+        scenarios['view_others_note'] = view_others_note
+    return scenarios
+
+def video_scenarios(dataset, rng):
+    """当前登录用户为 user0"""
+    usernames = dict(dataset['users'])
+
+    def serve_video_full():
+        _, user_id, filename, _ = rng.choice(dataset['videos'])
+        return 'GET', f'/user/{usernames[user_id]}/video_file/{filename}', None, {}
+
+    def serve_video_range():
+        _, user_id, filename, size = rng.choice(dataset['videos'])
+        start = rng.randrange(size)
+        end = min(size - 1, start + 256 * 1024)
+        return 'GET', f'/user/{usernames[user_id]}/video_file/{filename}', None, {'Range': f'bytes={start}-{end}'}
+
+    def play_video():
+        video_id, user_id, _, _ = rng.choice(dataset['videos'])
+        return 'GET', f'/user/{usernames[user_id]}/video/{video_id}', None, {}
+
+    def search():
+        name = rng.choice(dataset['users'])[1]
+        body, headers = form({'query': name[:rng.randint(2, len(name))]})
+        return 'POST', '/search', body, headers
+
+    def upload():
+        body, headers = multipart({'title': 'upload'}, {'video': ('upload.mp4', rng.randbytes(VIDEO_SIZES[0]))})
+        return 'POST', '/manage', body, headers
+
+    return {'serve_video_full': serve_video_full, 'serve_video_range': serve_video_range,
+            'play_video': play_video, 'search': search, 'upload': upload}
+
+def build_scenarios(app_name, dataset, rng):
+    if app_name == 'notepad':
+        return notepad_scenarios(dataset, rng)
+    return video_scenarios(dataset, rng)
+
+def check_login(location):
+    """登录成功会跳转到笔记列表/管理页，失败则跳回登录页"""
+    if not location or urllib.parse.urlparse(location).path == '/login':
+        raise RuntimeError('基准测试用户登录失败')
+
+def login_form(app_name, fetch_captcha):
+    data = {'username': 'user0', 'password': PASSWORD}
+    if app_name == 'video':
+        data['captcha'] = re.search(r'>(\w{5})<', fetch_captcha()).group(1)
+    return form(data)
+
+# ----------------------------------
+# 统计
+# ----------------------------------
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def summarize(samples, elapsed):
+    """samples: {场景: [(耗时秒, 状态码), ...]}"""
+    results = {}
+    for name, values in samples.items():
+        latencies = sorted(v[0] for v in values)
+        errors = sum(1 for v in values if v[1] >= 400)
+        results[name] = {
+            'count': len(values),
+            'errors': errors,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+            'p99_ms': round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+            'throughput_rps': round(len(values) / elapsed, 2) if elapsed else None,
+        }
+    return results
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss  # macOS 以字节计
+
+# ----------------------------------
+# 进程内驱动（Flask test client）
+# ----------------------------------
+def run_test_client(app, app_name, dataset, args):
+    client = app.test_client()
+    body, headers = login_form(app_name, lambda: client.get('/captcha').get_data(as_text=True))
+    check_login(client.post('/login', data=body, headers=headers).location)
+    rng = random.Random(args.seed)
+    scenarios = build_scenarios(app_name, dataset, rng)
+    samples = {}
+    wall = {}
+    start_all = time.perf_counter()
+    for name, make_request in scenarios.items():
+        for i in range(args.warmup + args.requests):
+            if i == args.warmup:
+                scenario_start = time.perf_counter()
+            method, path, body, headers = make_request()
+            start = time.perf_counter()
+            response = client.open(path, method=method, data=body, headers=headers)
+            response.get_data()
+            elapsed = time.perf_counter() - start
+            if i >= args.warmup:
+                samples.setdefault(name, []).append((elapsed, response.status_code))
+        wall[name] = time.perf_counter() - scenario_start
+    elapsed_all = time.perf_counter() - start_all
+    results = summarize(samples, None)
+    # 吞吐量按每个场景（不含预热）的实际墙钟时间计算，包含生成请求和 test client 自身的开销
+    for name, values in samples.items():
+        results[name]['throughput_rps'] = round(len(values) / wall[name], 2) if wall[name] else None
+    return results, {'peak_rss_kb': peak_rss_kb(), 'wall_seconds': round(elapsed_all, 3)}
+
+# ----------------------------------
+# 多进程 HTTP 驱动
+# ----------------------------------
+def serve(app_name, port, ready, stop, result_queue):
+    """子进程：启动多线程 werkzeug 服务器，收到停止信号后回报峰值内存"""
+    import logging
+    import threading
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)  # 关闭访问日志，避免干扰计时
+    module = load_app(app_name)
+    app = module.create_app()
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    ready.set()
+    stop.wait()
+    server.shutdown()
+    app.extensions['view_counter'].stop()
+    result_queue.put(peak_rss_kb())
+
+def http_worker(job):
+    app_name, base_url, dataset, seed, duration, warmup = job
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(method, path, body=None, headers=None):
+        req = urllib.request.Request(base_url + path, data=body, headers=headers or {}, method=method)
+        try:
+            with opener.open(req) as response:
+                data = response.read()
+                return response.status, data, response.url
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code, b'', e.url
+
+    body, headers = login_form(app_name, lambda: request('GET', '/captcha')[1].decode())
+    check_login(request('POST', '/login', body, headers)[2])
+    rng = random.Random(seed)
+    scenarios = list(build_scenarios(app_name, dataset, rng).items())
+    samples = {}
+    deadline = time.perf_counter() + warmup + duration
+    warm_until = time.perf_counter() + warmup
+    while time.perf_counter() < deadline:
+        name, make_request = rng.choice(scenarios)
+        method, path, body, headers = make_request()
+        start = time.perf_counter()
+        status, _, _ = request(method, path, body, headers)
+        elapsed = time.perf_counter() - start
+        if start >= warm_until:
+            samples.setdefault(name, []).append((elapsed, status))
+    return samples
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def run_http(app_name, dataset, args):
+    ctx = multiprocessing.get_context('spawn')
+    port = free_port()
+    ready, stop, result_queue = ctx.Event(), ctx.Event(), ctx.Queue()
+    server = ctx.Process(target=serve, args=(app_name, port, ready, stop, result_queue))
+    server.start()
+    try:
+        if not ready.wait(60):
+            raise RuntimeError('服务器启动超时')
+        jobs = [(app_name, f'http://127.0.0.1:{port}', dataset, args.seed + i, args.duration, args.warmup_seconds)
+                for i in range(args.processes)]
+        with ctx.Pool(args.processes) as pool:
+            start = time.perf_counter()
+            per_worker = pool.map(http_worker, jobs)
+            elapsed = time.perf_counter() - start - args.warmup_seconds
+        samples = {}
+        for worker_samples in per_worker:
+            for name, values in worker_samples.items():
+                samples.setdefault(name, []).extend(values)
+        stop.set()
+        server_rss = result_queue.get(timeout=30)
+    finally:
+        stop.set()
+        server.join(30)
+        if server.is_alive():
+            server.terminate()
+    total = sum(len(v) for v in samples.values())
+    memory = {'server_peak_rss_kb': server_rss, 'total_throughput_rps': round(total / elapsed, 2)}
+    return summarize(samples, elapsed), memory
+
+# ----------------------------------
+# 冷启动驱动：每轮都在全新的解释器中运行 startup_probe
+# ----------------------------------
+def startup_probe(app_name):
+    """子进程：依次计时导入模块、create_app() 和首个请求，结果以 JSON 写到标准输出"""
+    timings = {}
+    start = time.perf_counter()
+    module = load_app(app_name)
+    timings['import_ms'] = time.perf_counter() - start
+    start = time.perf_counter()
+    app = module.create_app()
+    timings['create_app_ms'] = time.perf_counter() - start
+    start = time.perf_counter()
+    response = app.test_client().get('/login')
+    response.get_data()
+    timings['first_request_ms'] = time.perf_counter() - start
+    if app_name == 'notepad':  # 首次渲染 Markdown 会加载扩展和 Pygments 词法分析器
+        start = time.perf_counter()
+        with app.app_context():
+            module.render_markdown('# 标题\n\n```python\nprint(1)\n```\n')
+        timings['first_markdown_ms'] = time.perf_counter() - start
+    timings = {k: round(v * 1000, 2) for k, v in timings.items()}
+    timings['status'] = response.status_code
+    timings['modules_loaded'] = len(sys.modules)
+    print(json.dumps(timings))
+
+def run_startup(app_name, args):
+    runs = []
+    for _ in range(args.warmup_runs + args.runs):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--app', app_name, '--startup-probe'],
+                                check=True, capture_output=True, text=True, env=os.environ).stdout
+        total = (time.perf_counter() - start) * 1000
+        timings = json.loads(output.strip().splitlines()[-1])
+        if timings.pop('status') != 200:
+            raise RuntimeError('首个请求没有返回 200')
+        timings['total_ms'] = round(total, 2)
+        runs.append(timings)
+    runs = runs[args.warmup_runs:]
+    results = {}
+    for key in runs[0]:
+        values = sorted(r[key] for r in runs)
+        results[key] = {'p50': percentile(values, 50), 'max': values[-1]}
+    # 工作进程可以开始服务所需的时间：解释器启动 + 导入 + create_app + 首个请求
+    ready = sorted(r['total_ms'] for r in runs)
+    memory = {'ready_p50_ms': percentile(ready, 50), 'ready_max_ms': ready[-1]}
+    if args.budget_ms:
+        memory['budget_ms'] = args.budget_ms
+        memory['within_budget'] = ready[-1] <= args.budget_ms
+    return results, memory
+
+# ----------------------------------
+# 入口
+# ----------------------------------
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='笔记本/视频平台基准测试')
+    parser.add_argument('--app', choices=['notepad', 'video'], default='notepad')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--notes', type=int, default=500, help='notepad：笔记总数')
+    parser.add_argument('--sections', type=int, default=12, help='notepad：每篇笔记的最大章节数')
+    parser.add_argument('--videos', type=int, default=30, help='video：视频总数')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--requests', type=int, default=200, help='进程内模式：每个场景的请求数')
+    parser.add_argument('--warmup', type=int, default=10, help='进程内模式：每个场景的预热请求数')
+    parser.add_argument('--http', action='store_true', help='启动真实 HTTP 服务器并用多进程压测')
+    parser.add_argument('--processes', type=int, default=4, help='HTTP 模式：压测进程数')
+    parser.add_argument('--duration', type=float, default=10.0, help='HTTP 模式：压测秒数')
+    parser.add_argument('--warmup-seconds', type=float, default=1.0, help='HTTP 模式：预热秒数')
+    parser.add_argument('--startup', action='store_true', help='测量冷启动：导入、create_app() 和首个请求耗时')
+    parser.add_argument('--runs', type=int, default=10, help='冷启动模式：计入结果的启动次数')
+    parser.add_argument('--warmup-runs', type=int, default=1, help='冷启动模式：预热次数（填充操作系统文件缓存）')
+    parser.add_argument('--budget-ms', type=float, help='冷启动模式：启动耗时预算，超出时以非零状态退出')
+    parser.add_argument('--startup-probe', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--output', help='结果 JSON 文件路径，不填则打印到标准输出')
+    parser.add_argument('--keep', action='store_true', help='保留临时数据目录')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.startup_probe:
+        startup_probe(args.app)
+        return
+    workdir = tempfile.mkdtemp(prefix=f'bench-{args.app}-')
+    app = None
+    try:
+        configure_env(workdir)
+        module = load_app(args.app)
+        app = module.create_app()
+        rng = random.Random(args.seed)
+        seed_start = time.perf_counter()
+        if args.startup:
+            # 冷启动只需要表结构，不生成数据
+            with app.app_context():
+                module.init_db()
+        elif args.app == 'notepad':
+            dataset = seed_notepad(module, app, rng, args.users, args.notes, args.sections)
+        else:
+            dataset = seed_video(module, app, rng, args.users, args.videos)
+        seed_seconds = time.perf_counter() - seed_start
+        if args.startup:
+            mode = 'startup'
+            results, memory = run_startup(args.app, args)
+        elif args.http:
+            mode = 'http'
+            results, memory = run_http(args.app, dataset, args)
+        else:
+            mode = 'test_client'
+            results, memory = run_test_client(app, args.app, dataset, args)
+        report = {
+            'app': args.app,
+            'mode': mode,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'config': {k: v for k, v in vars(args).items() if k not in ('output', 'keep')},
+            'seed_seconds': round(seed_seconds, 3),
+            'memory': memory,
+            'results': results,
+        }
+        text = json.dumps(report, indent=2, ensure_ascii=False)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(text + '\n')
+        else:
+            print(text)
+        if memory.get('within_budget') is False:
+            sys.exit(1)
+    finally:
+        if app is not None:
+            # 删除数据目录前写入缓冲的浏览计数并停止后台线程，避免退出时再写已删除的数据库
+            app.extensions['view_counter'].stop()
+        if args.keep:
+            print(f'数据目录：{workdir}', file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
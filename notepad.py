@@ -1,14 +1,85 @@
-from flask import Flask, render_template_string, request, redirect, url_for, session, flash
+import atexit
+import difflib
+import hashlib
+import io
+import json
+import os
+import re
+import secrets
+import sqlite3
+import sys
+import tarfile
+import threading
+import time
+import uuid
+import zipfile
+from urllib.parse import quote
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+
+import click
+
+from flask import (Flask, Blueprint, current_app, has_app_context, render_template_string, request, redirect,
+                   url_for, session, flash, g, Response, abort, jsonify, stream_with_context,
+                   before_render_template, template_rendered)
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
 from flask_sqlalchemy import SQLAlchemy
+from itsdangerous import BadSignature, Signer
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import load_only
+from werkzeug.datastructures import CallbackDict
 from werkzeug.security import generate_password_hash, check_password_hash
-import markdown
 from markupsafe import Markup
 
-app = Flask(__name__)
-app.secret_key = 'replace_with_a_long_random_secret_key'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///notes_auth.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
+# 应用由 create_app() 创建；数据库扩展、路由、钩子和命令行都在其中按需注册
+db = SQLAlchemy()
+bp = Blueprint('main', __name__, cli_group=None)
+
+DEFAULT_CONFIG = {
+    'SECRET_KEY': 'replace_with_a_long_random_secret_key',
+    'SQLALCHEMY_DATABASE_URI': 'sqlite:///notes_auth.db',
+    'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    # 会话存储后端：'sqlite'（多进程共享同一文件）或 'memory'（进程内LRU，只适用于单进程部署）
+    'SESSION_BACKEND': 'sqlite',
+    'SESSION_SQLITE_PATH': 'sessions.db',  # 相对路径位于实例目录（instance/）下
+    'SESSION_MEMORY_MAXSIZE': 10000,
+    # 未登录会话（只含提示消息等）的有效秒数，以及 memory 后端为其单独保留的最大数量
+    'SESSION_ANONYMOUS_LIFETIME': 1800,
+    'SESSION_ANONYMOUS_MAXSIZE': 10000,
+    # 性能指标：开启后在 /metrics 以 Prometheus 文本格式输出
+    'METRICS_ENABLED': False,
+    # 慢请求采样分析：超过该毫秒数的请求把调用栈以 flamegraph 折叠格式写入 PROFILE_DIR，0 表示关闭
+    'PROFILE_SLOW_REQUEST_MS': 0,
+    'PROFILE_INTERVAL_MS': 5,
+    'PROFILE_DIR': 'profiles',
+    # 历史版本：每隔多少个版本保存一次完整快照，其余版本只保存相对上一版本的增量
+    'REVISION_SNAPSHOT_INTERVAL': 20,
+    # Markdown 分块渲染结果缓存的最大块数
+    'RENDER_CACHE_MAXSIZE': 20000,
+    # 批量导入：每批插入的笔记数，以及单篇笔记的最大字节数
+    'IMPORT_BATCH_SIZE': 500,
+    'IMPORT_MAX_NOTE_BYTES': 10 * 1024 * 1024,
+    # JSON API：单次批量查询的最大 ID 数与分页大小上限
+    'API_MAX_IDS': 100,
+    'API_MAX_LIMIT': 100,
+    # 令牌接口没有验证码，按窗口秒数限制同一用户名与同一 IP 的密码错误次数，超过后返回 429
+    'API_LOGIN_WINDOW': 900,
+    'API_LOGIN_MAX_FAILURES': 5,
+    'API_LOGIN_MAX_FAILURES_PER_IP': 50,
+    # 为真时在后台线程预先导入 Markdown/Pygments，避免首个查看笔记的请求承担加载耗时
+    'MARKDOWN_WARMUP': False,
+    # 发现页：浏览次数在内存中累积多少秒后批量写入；排行表多少秒重算一次，所有工作进程合计每个间隔只重算一次
+    # （0 表示后台线程不重算，只用 flask refresh-feed 命令刷新）
+    'VIEW_FLUSH_INTERVAL': 10,
+    'FEED_REFRESH_INTERVAL': 60,
+    # 热门榜统计最近多少小时的浏览次数，以及热门/最新两个榜单各保留多少条
+    'FEED_WINDOW_HOURS': 72,
+    'FEED_SIZE': 30,
+}
 
 # ----------------------------------
 # 数据模型定义
@@ -26,9 +97,456 @@ class Note(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     is_public = db.Column(db.Boolean, default=False, nullable=False)
 
+class NoteRevision(db.Model):
+    """笔记历史版本：is_snapshot 为真时 data 是完整内容，否则是相对上一版本的行级增量（JSON）"""
+    id = db.Column(db.Integer, primary_key=True)
+    note_id = db.Column(db.Integer, db.ForeignKey('note.id'), nullable=False, index=True)
+    number = db.Column(db.Integer, nullable=False)
+    title = db.Column(db.String(150), nullable=False)
+    is_snapshot = db.Column(db.Boolean, nullable=False)
+    data = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    __table_args__ = (db.UniqueConstraint('note_id', 'number'),)
+
+class ApiToken(db.Model):
+    """API 访问令牌，只保存令牌的 SHA-256 摘要"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    token_hash = db.Column(db.String(64), unique=True, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+class LoginFailure(db.Model):
+    """令牌接口的密码错误计数，key 为 ip:<地址> 或 user:<用户名>"""
+    key = db.Column(db.String(200), primary_key=True)
+    failures = db.Column(db.Integer, nullable=False)
+    window_start = db.Column(db.Float, nullable=False)
+
+class NoteViewBucket(db.Model):
+    """按小时汇总的笔记浏览次数，hour 为 Unix 时间戳整除 3600"""
+    note_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    hour = db.Column(db.Integer, primary_key=True, autoincrement=False, index=True)
+    views = db.Column(db.Integer, nullable=False)
+
+class FeedState(db.Model):
+    """只有一行，记录排行表上次重算的时间；重算前先抢占这一行，多个工作进程不会重复重算"""
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    refreshed_at = db.Column(db.Float, nullable=False)
+
+class FeedEntry(db.Model):
+    """物化的发现页排行表：feed 为 popular（热门）或 recent（最新），position 为名次"""
+    feed = db.Column(db.String(10), primary_key=True)
+    position = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    note_id = db.Column(db.Integer, nullable=False)
+    views = db.Column(db.Integer, nullable=False)
+
+# ----------------------------------
+# 服务端会话存储（Cookie 中只保存签名后的会话ID）
+# ----------------------------------
+class ServerSession(CallbackDict, SessionMixin):
+    """服务端会话对象，内容修改时自动标记 modified"""
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.old_sid = None
+
+    def regenerate(self):
+        """更换会话ID（登录时调用，防止会话固定攻击）"""
+        self.old_sid = self.sid
+        self.sid = uuid.uuid4().hex
+        self.new = True
+        self.modified = True
+
+class MemorySessionStore:
+    """进程内 LRU 会话存储，超出容量时淘汰最久未访问的会话"""
+    def __init__(self, maxsize=10000, anonymous_maxsize=10000):
+        self.maxsize = maxsize
+        self.anonymous_maxsize = anonymous_maxsize
+        self._data = OrderedDict()
+        self._anonymous = OrderedDict()  # 未登录会话单独淘汰，大量匿名请求不会挤掉已登录会话
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        with self._lock:
+            for data in (self._data, self._anonymous):
+                item = data.get(sid)
+                if item is None:
+                    continue
+                expires, value = item
+                if expires < time.time():
+                    del data[sid]
+                    return None
+                data.move_to_end(sid)
+                return value
+            return None
+
+    def set(self, sid, value, expires, anonymous=False):
+        with self._lock:
+            data, other, maxsize = ((self._anonymous, self._data, self.anonymous_maxsize) if anonymous
+                                    else (self._data, self._anonymous, self.maxsize))
+            other.pop(sid, None)
+            data[sid] = (expires, value)
+            data.move_to_end(sid)
+            while len(data) > maxsize:
+                data.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+            self._anonymous.pop(sid, None)
+
+    def setup(self):
+        pass
+
+class SqliteSessionStore:
+    """SQLite 会话存储，每个线程持有独立连接，多进程可共享同一数据库文件"""
+    def __init__(self, path, purge_interval=60):
+        self.path = path
+        self.purge_interval = purge_interval
+        self._next_purge = 0.0
+        self._local = threading.local()
+
+    def setup(self):
+        """创建会话表（由 init-db 命令调用）"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')  # 多进程读写时读不阻塞写
+        conn.execute('CREATE TABLE IF NOT EXISTS sessions ('
+                     'sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL NOT NULL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires)')
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            self._local.conn = conn
+        return conn
+
+    def get(self, sid):
+        conn = self._conn()
+        row = conn.execute('SELECT data, expires FROM sessions WHERE sid = ?', (sid,)).fetchone()
+        if row is None:
+            return None
+        if row[1] < time.time():
+            self.delete(sid)
+            return None
+        return row[0]
+
+    def set(self, sid, value, expires, anonymous=False):
+        conn = self._conn()
+        conn.execute('INSERT OR REPLACE INTO sessions (sid, data, expires) VALUES (?, ?, ?)',
+                     (sid, value, expires))
+        # 过期会话不会再被读取，写入时顺带按间隔批量清理
+        now = time.time()
+        if now >= self._next_purge:
+            self._next_purge = now + self.purge_interval
+            conn.execute('DELETE FROM sessions WHERE expires < ?', (now,))
+        conn.commit()
+
+    def delete(self, sid):
+        conn = self._conn()
+        conn.execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+        conn.commit()
+
+def make_session_store(app):
+    """根据 SESSION_BACKEND 配置创建会话存储后端"""
+    backend = app.config['SESSION_BACKEND']
+    if backend == 'memory':
+        return MemorySessionStore(app.config['SESSION_MEMORY_MAXSIZE'], app.config['SESSION_ANONYMOUS_MAXSIZE'])
+    if backend == 'sqlite':
+        # 相对路径放在实例目录下，不依赖启动时的工作目录
+        return SqliteSessionStore(os.path.join(app.instance_path, app.config['SESSION_SQLITE_PATH']))
+    raise ValueError(f'未知的会话存储后端：{backend}')
+
+class ServerSideSessionInterface(SessionInterface):
+    """会话数据保存在服务端，只有会话内容变化时才写存储，只有新会话才下发Cookie"""
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store):
+        self.store = store
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='server-side-session')
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+            if sid:
+                data = self.store.get(sid)
+                if data is not None:
+                    return ServerSession(self.serializer.loads(data), sid=sid)
+        return ServerSession(sid=uuid.uuid4().hex, new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.old_sid:
+            self.store.delete(session.old_sid)
+        if not session:
+            # 会话被清空（如登出）：删除服务端数据和Cookie
+            if not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app))
+            return
+        if session.modified or session.new:
+            # 未登录的会话（验证码、提示消息）只保留较短时间
+            anonymous = 'user_id' not in session
+            lifetime = (app.config['SESSION_ANONYMOUS_LIFETIME'] if anonymous
+                        else app.permanent_session_lifetime.total_seconds())
+            self.store.set(session.sid, self.serializer.dumps(dict(session)), time.time() + lifetime, anonymous)
+        if session.new:
+            response.set_cookie(name, self._signer(app).sign(session.sid).decode(),
+                                expires=self.get_expiration_time(app, session),
+                                httponly=self.get_cookie_httponly(app),
+                                domain=domain, path=path,
+                                secure=self.get_cookie_secure(app),
+                                samesite=self.get_cookie_samesite(app))
+
+class UserCache:
+    """缓存已脱离数据库会话的 User 对象，按会话中的 user_id 取用，用户被修改或删除时失效"""
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            user = self._data.get(user_id)
+            if user is not None:
+                self._data.move_to_end(user_id)
+        if user is None:
+            user = db.session.get(User, user_id)
+            if user is None:
+                return None
+            db.session.expunge(user)
+            with self._lock:
+                self._data[user_id] = user
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        # load=False 直接把缓存状态挂到当前数据库会话，不发 SELECT
+        return db.session.merge(user, load=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._data.pop(user_id, None)
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def invalidate_cached_user(mapper, connection, target):
+    if has_app_context():
+        current_app.extensions['user_cache'].invalidate(target.id)
+
+def get_current_user():
+    """获取当前登录用户，优先使用缓存"""
+    if 'user_id' in session:
+        return current_app.extensions['user_cache'].get(session['user_id'])
+    return None
+
+# ----------------------------------
+# 性能指标与慢请求采样分析（默认关闭）
+# ----------------------------------
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """按标签分组的直方图，输出 Prometheus 文本格式"""
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                labels = ','.join(f'{k}="{escape_label(v)}"' for k, v in key)
+                prefix = labels + ',' if labels else ''
+                for bound, c in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {c}')
+                lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+                lines.append(f'{self.name}_sum{{{labels}}} {total}')
+                lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return lines
+
+class CounterMetric:
+    """按标签分组的计数器，输出 Prometheus 文本格式"""
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._series = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._series[key] += amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._series.items()):
+                labels = ','.join(f'{k}="{escape_label(v)}"' for k, v in key)
+                lines.append(f'{self.name}{{{labels}}} {value}')
+        return lines
+
+def escape_label(value):
+    """转义 Prometheus 标签值中的特殊字符"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', '每个路由的请求耗时')
+SQL_LATENCY = Histogram('sql_statement_duration_seconds', 'SQL语句执行耗时，按语句类型分组')
+FUNCTION_LATENCY = Histogram('function_duration_seconds', '热点函数耗时（Markdown渲染、LCS、密码哈希）')
+TEMPLATE_LATENCY = Histogram('template_render_duration_seconds', '模板渲染耗时')
+RENDER_CACHE_REQUESTS = CounterMetric('markdown_block_cache_requests_total', 'Markdown分块渲染缓存命中与未命中次数')
+ALL_METRICS = (REQUEST_LATENCY, SQL_LATENCY, FUNCTION_LATENCY, TEMPLATE_LATENCY, RENDER_CACHE_REQUESTS)
+
+@contextmanager
+def timed(name):
+    """记录代码块耗时，也可作为装饰器使用；未开启指标时不做任何事"""
+    if not (has_app_context() and current_app.config['METRICS_ENABLED']):
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        FUNCTION_LATENCY.observe(time.perf_counter() - start, name=name)
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_sql_timer(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context() and current_app.config['METRICS_ENABLED']:
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_sql_timer(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start')
+    if starts:
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'UNKNOWN'
+        SQL_LATENCY.observe(time.perf_counter() - starts.pop(), statement=verb)
+
+@event.listens_for(Engine, 'handle_error')
+def discard_sql_timer(context):
+    """语句执行出错时不会触发 after_cursor_execute，丢弃其开始时间，避免在连接池的连接上越积越多"""
+    starts = context.connection.info.get('query_start') if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+def start_template_timer(sender, template, context, **extra):
+    if current_app.config['METRICS_ENABLED']:
+        g.template_start = time.perf_counter()
+
+def record_template_timer(sender, template, context, **extra):
+    start = g.pop('template_start', None)
+    if start is not None:
+        TEMPLATE_LATENCY.observe(time.perf_counter() - start, template=template.name or 'string')
+
+def fold_stack(frame):
+    """把调用栈转换为 flamegraph 折叠格式（根在前，分号分隔）"""
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(parts))
+
+class StackSampler:
+    """后台线程定时采样正在处理请求的线程的调用栈"""
+    def __init__(self):
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def begin(self, interval):
+        with self._lock:
+            self._active[threading.get_ident()] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(interval,), daemon=True)
+                self._thread.start()
+
+    def end(self):
+        with self._lock:
+            return self._active.pop(threading.get_ident(), None)
+
+    def _run(self, interval):
+        while True:
+            time.sleep(interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for ident, stacks in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stacks[fold_stack(frame)] += 1
+
+stack_sampler = StackSampler()
+
+def dump_profile(stacks, endpoint, elapsed):
+    """把慢请求的采样结果写成 .folded 文件，可直接交给 flamegraph.pl / speedscope"""
+    os.makedirs(current_app.config['PROFILE_DIR'], exist_ok=True)
+    filename = f'{int(time.time() * 1000)}-{endpoint}-{int(elapsed * 1000)}ms.folded'
+    with open(os.path.join(current_app.config['PROFILE_DIR'], filename), 'w', encoding='utf-8') as f:
+        for stack, count in stacks.most_common():
+            f.write(f'{stack} {count}\n')
+
+@bp.before_app_request
+def start_request_timer():
+    if current_app.config['METRICS_ENABLED'] or current_app.config['PROFILE_SLOW_REQUEST_MS']:
+        g.request_start = time.perf_counter()
+    if current_app.config['PROFILE_SLOW_REQUEST_MS']:
+        stack_sampler.begin(current_app.config['PROFILE_INTERVAL_MS'] / 1000)
+
+@bp.teardown_app_request
+def record_request_timer(exc):
+    start = g.pop('request_start', None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    endpoint = request.endpoint or 'unknown'
+    if current_app.config['METRICS_ENABLED']:
+        REQUEST_LATENCY.observe(elapsed, endpoint=endpoint, method=request.method)
+    if current_app.config['PROFILE_SLOW_REQUEST_MS']:
+        stacks = stack_sampler.end()
+        if stacks and elapsed * 1000 >= current_app.config['PROFILE_SLOW_REQUEST_MS']:
+            dump_profile(stacks, endpoint, elapsed)
+
+@bp.route('/metrics')
+def metrics():
+    if not current_app.config['METRICS_ENABLED']:
+        abort(404)
+    lines = []
+    for metric in ALL_METRICS:
+        lines.extend(metric.render())
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
 # ----------------------------------
 # 工具函数
 # ----------------------------------
+@timed('lcs_length')
 def lcs_length(s1, s2):
     """计算s1和s2的最长公共子序列长度，忽略大小写"""
     m, n = len(s1), len(s2)
@@ -41,6 +559,401 @@ def lcs_length(s1, s2):
                 dp[i+1][j+1] = max(dp[i+1][j], dp[i][j+1])
     return dp[m][n]
 
+# ----------------------------------
+# 历史版本（行级增量 + 定期完整快照）
+# ----------------------------------
+def make_line_delta(old, new):
+    """计算行级增量：[[起始行, 结束行, [替换后的行...]], ...]，行号基于旧文本"""
+    a = old.split('\n')
+    b = new.split('\n')
+    ops = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b).get_opcodes():
+        if tag != 'equal':
+            ops.append([i1, i2, b[j1:j2]])
+    return ops
+
+def apply_line_delta(text, ops):
+    """把行级增量应用到文本上，增量格式非法时抛出 ValueError"""
+    lines = text.split('\n')
+    result = []
+    pos = 0
+    for op in ops:
+        if not (isinstance(op, list) and len(op) == 3):
+            raise ValueError('增量格式错误')
+        start, end, new_lines = op
+        if not (isinstance(start, int) and isinstance(end, int) and pos <= start <= end <= len(lines)):
+            raise ValueError('增量行号越界或未按顺序排列')
+        if not (isinstance(new_lines, list) and all(isinstance(line, str) for line in new_lines)):
+            raise ValueError('增量内容必须是字符串列表')
+        result.extend(lines[pos:start])
+        result.extend(new_lines)
+        pos = end
+    result.extend(lines[pos:])
+    return '\n'.join(result)
+
+def latest_revision(note_id):
+    return NoteRevision.query.filter_by(note_id=note_id).order_by(NoteRevision.number.desc()).first()
+
+def record_revision(note, old_content, old_title=None):
+    """在 note 内容更新后、提交前调用，记录一个新版本。
+    笔记还没有任何版本（历史功能上线前创建或批量导入的笔记）时，先把旧内容存为版本 1 的快照"""
+    last = latest_revision(note.id)
+    last_snapshot = None
+    if last is None and old_content:
+        last = NoteRevision(note_id=note.id, number=1, title=old_title or note.title,
+                            is_snapshot=True, data=old_content)
+        db.session.add(last)
+        last_snapshot = 1
+    number = last.number + 1 if last else 1
+    is_snapshot = True
+    data = note.content
+    if last is not None:
+        if last_snapshot is None:
+            last_snapshot = db.session.query(db.func.max(NoteRevision.number)).filter_by(
+                note_id=note.id, is_snapshot=True).scalar() or 0
+        if number - last_snapshot < current_app.config['REVISION_SNAPSHOT_INTERVAL']:
+            delta = json.dumps(make_line_delta(old_content, note.content), ensure_ascii=False)
+            # 增量比全文还大时直接存快照
+            if len(delta) < len(note.content):
+                is_snapshot, data = False, delta
+    revision = NoteRevision(note_id=note.id, number=number, title=note.title,
+                            is_snapshot=is_snapshot, data=data)
+    db.session.add(revision)
+    return revision
+
+def revision_content(note_id, number):
+    """从最近的快照开始依次应用增量，还原指定版本的内容"""
+    snapshot = NoteRevision.query.filter(NoteRevision.note_id == note_id, NoteRevision.number <= number,
+                                         NoteRevision.is_snapshot.is_(True)) \
+        .order_by(NoteRevision.number.desc()).first()
+    if snapshot is None:
+        return None
+    deltas = NoteRevision.query.filter(NoteRevision.note_id == note_id, NoteRevision.number > snapshot.number,
+                                       NoteRevision.number <= number).order_by(NoteRevision.number).all()
+    content = snapshot.data
+    for revision in deltas:
+        content = apply_line_delta(content, json.loads(revision.data))
+    return content
+
+# ----------------------------------
+# Markdown 分块渲染
+# 笔记按顶层块（段落、标题、列表、表格、围栏代码、$$公式$$）切分，每块独立经 extra/codehilite 渲染，
+# 渲染结果按块内容哈希缓存：编辑只需重新渲染改动的块，不同笔记中相同的样板内容也能共享缓存
+# ----------------------------------
+MARKDOWN_EXTENSIONS = ['extra', 'codehilite']
+FENCE_RE = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+LIST_RE = re.compile(r'^ {0,3}([*+-]|\d+[.)])\s')
+QUOTE_RE = re.compile(r'^ {0,3}>')
+HEADING_RE = re.compile(r'^#{1,6}(\s|$)')
+DEFINITION_RE = re.compile(r'^ {0,3}:[ \t]', re.MULTILINE)
+# Python-Markdown 当作原始 HTML 块处理的块级标签（markdown.util.BLOCK_LEVEL_ELEMENTS）
+HTML_BLOCK_TAGS = ('address|article|aside|blockquote|body|canvas|center|colgroup|dd|details|div|dl|dt|fieldset|'
+                   'figcaption|figure|footer|form|group|h[1-6]|header|hgroup|hr|html|iframe|legend|li|main|map|'
+                   'math|menu|nav|noscript|object|ol|option|output|p|pre|progress|script|section|style|summary|'
+                   'table|tbody|td|textarea|tfoot|th|thead|tr|ul|video')
+# 引用式链接、脚注、缩写的定义会影响其他块；原始 HTML 块（块级标签、注释、声明）可以跨越空行。出现时整篇渲染。
+# 行首的自动链接 <https://...> 和行内标签不在此列
+CROSS_BLOCK_RE = re.compile(r'^ {0,3}(\[[^\]]+\]:|\*\[[^\]]+\]:|<[!?]|</?(' + HTML_BLOCK_TAGS + r')(?=[\s/>]|$))',
+                            re.MULTILINE | re.IGNORECASE)
+# 缓存键包含扩展配置，修改扩展后旧缓存自动失效
+RENDER_CACHE_SALT = ','.join(MARKDOWN_EXTENSIONS).encode() + b'\0'
+
+class RenderCache:
+    """按块内容哈希缓存渲染后的 HTML 片段，LRU 淘汰"""
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            html = self._data.get(key)
+            if html is not None:
+                self._data.move_to_end(key)
+            return html
+
+    def set(self, key, html):
+        with self._lock:
+            self._data[key] = html
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+_markdown_local = threading.local()
+
+def get_markdown():
+    """每个线程复用一个 Markdown 实例；首次使用时才导入 markdown 并加载扩展（codehilite 会导入 Pygments）"""
+    md = getattr(_markdown_local, 'md', None)
+    if md is None:
+        import markdown
+        md = _markdown_local.md = markdown.Markdown(extensions=MARKDOWN_EXTENSIONS)
+    return md.reset()
+
+def warm_up_markdown():
+    """渲染一段带代码的示例，提前完成 Markdown 扩展与 Pygments 词法分析器的导入"""
+    get_markdown().convert('# warm up\n\n```python\nprint(1)\n```\n')
+
+def in_math(block):
+    """块中 $$ 出现奇数次说明公式尚未闭合"""
+    return sum(line.count('$$') for line in block) % 2 == 1
+
+def block_constructs(line):
+    """行首出现的列表项或引用；列表和引用都会吞并后续的懒惰续行，一旦出现就可能延续到块尾"""
+    constructs = set()
+    if LIST_RE.match(line):
+        constructs.add('list')
+    if QUOTE_RE.match(line):
+        constructs.add('quote')
+    return constructs
+
+def continues_block(line, block, constructs):
+    """空行之后的 line 是否仍属于上一个块（缩进续行、块中已有列表时的列表项、已有引用时的引用、未闭合的公式）；
+    constructs 记录块中任意一行开始的列表和引用，块中段开始的列表或引用同样会被后续块延续"""
+    if line[:1] in (' ', '\t'):
+        return True
+    if LIST_RE.match(line) and 'list' in constructs:
+        return True
+    if QUOTE_RE.match(line) and 'quote' in constructs:
+        return True
+    return in_math(block)
+
+def heading_absorbed(segment):
+    """以表格行或缩进续行开头的块会把其后的行（包括 # 标题）整体当作表格或列表项内容，标题不能从中切出"""
+    return bool(segment) and ('|' in segment[0] or segment[0][:1] in (' ', '\t'))
+
+def starts_definition(block, previous):
+    """定义列表跨空行延续：以 ": " 开头的块把上一块当作术语，紧跟在定义列表后的定义块会并入同一个 <dl>"""
+    return bool(DEFINITION_RE.search(block)) and bool(DEFINITION_RE.match(block) or DEFINITION_RE.search(previous))
+
+def split_blocks(text):
+    """按空行把 Markdown 切分为互不影响的顶层块，ATX 标题单独成块，围栏代码块内的空行不切分"""
+    blocks = []
+    gaps = []  # 每个块之前被切掉的空行，合并定义列表时原样放回
+    current = []
+    segment = 0  # current 中最后一个空行之后的起始位置，即 Python-Markdown 看到的当前块
+    constructs = set()
+    blank = []
+    gap = []
+    fence = None
+    for line in text.split('\n'):
+        if fence is not None:
+            current.append(line)
+            match = FENCE_RE.match(line)
+            if match and match.group(1)[0] == fence[0] and len(match.group(1)) >= len(fence):
+                fence = None
+                segment = len(current)  # 围栏代码块被替换为独立的块，其后的行另起一块
+            continue
+        if not line.strip():
+            if current:
+                blank.append(line)
+            continue
+        if blank:
+            if continues_block(line, current, constructs):
+                current.extend(blank)
+                segment = len(current)
+            else:
+                blocks.append('\n'.join(current))
+                gaps.append(gap)
+                current = []
+                segment = 0
+                constructs = set()
+                gap = blank
+            blank = []
+        if HEADING_RE.match(line) and not in_math(current) and not heading_absorbed(current[segment:]):
+            if current:
+                blocks.append('\n'.join(current))
+                gaps.append(gap)
+                gap = []
+            blocks.append(line)
+            gaps.append(gap)
+            current = []
+            segment = 0
+            constructs = set()
+            gap = []
+            continue
+        match = FENCE_RE.match(line)
+        if match:
+            fence = match.group(1)
+        else:
+            constructs |= block_constructs(line)
+        current.append(line)
+    if current:
+        blocks.append('\n'.join(current))
+        gaps.append(gap)
+    merged = []
+    merged_gaps = []
+    for block, gap in zip(blocks, gaps):
+        merged.append(block)
+        merged_gaps.append(gap)
+        # 并入上一块后，新的定义列表可能又紧跟在更早的定义列表之后，继续向前合并
+        while len(merged) > 1 and starts_definition(merged[-1], merged[-2]):
+            block, gap = merged.pop(), merged_gaps.pop()
+            merged[-1] = '\n'.join([merged[-1]] + gap + [block])
+    return merged
+
+def render_block(block):
+    """渲染单个块，命中缓存时直接返回"""
+    key = hashlib.sha1(RENDER_CACHE_SALT + block.encode('utf-8')).hexdigest()
+    render_cache = current_app.extensions['render_cache']
+    html = render_cache.get(key)
+    hit = html is not None
+    if not hit:
+        html = get_markdown().convert(block)
+        render_cache.set(key, html)
+    if current_app.config['METRICS_ENABLED']:
+        RENDER_CACHE_REQUESTS.inc(result='hit' if hit else 'miss')
+    return html
+
+@timed('markdown')
+def render_markdown(text):
+    """把 Markdown 文本渲染为 HTML，未改动的块直接复用缓存"""
+    if CROSS_BLOCK_RE.search(text):
+        return Markup(get_markdown().convert(text))
+    return Markup('\n'.join(render_block(block) for block in split_blocks(text)))
+
+# ----------------------------------
+# 批量导入导出（zip / tar 中的 .md 文件，或每行一个 JSON 对象的 NDJSON）
+# ----------------------------------
+MARKDOWN_SUFFIXES = ('.md', '.markdown')
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+NDJSON_SUFFIXES = ('.ndjson', '.jsonl')
+UNSAFE_FILENAME_RE = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+def title_from_path(path):
+    """用不含扩展名的文件名作为笔记标题"""
+    title = os.path.splitext(os.path.basename(path))[0].strip()
+    return (title or '未命名笔记')[:150]
+
+def decode_note(data, name):
+    if len(data) > current_app.config['IMPORT_MAX_NOTE_BYTES']:
+        raise ValueError(f'{name} 超过单篇笔记大小上限')
+    try:
+        return data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise ValueError(f'{name} 不是 UTF-8 编码')
+
+def iter_import_records(fileobj, filename):
+    """按文件类型逐条解析，产出 (标题, 内容, 是否公开)，是否公开为 None 时使用调用方的默认值"""
+    lower = filename.lower()
+    if lower.endswith('.zip'):
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(MARKDOWN_SUFFIXES):
+                    continue
+                if info.file_size > current_app.config['IMPORT_MAX_NOTE_BYTES']:
+                    raise ValueError(f'{info.filename} 超过单篇笔记大小上限')
+                yield title_from_path(info.filename), decode_note(archive.read(info), info.filename), None
+    elif lower.endswith(TAR_SUFFIXES):
+        # 流式模式，按成员顺序读取，不需要可随机访问的文件
+        with tarfile.open(fileobj=fileobj, mode='r|*') as archive:
+            for member in archive:
+                if not member.isfile() or not member.name.lower().endswith(MARKDOWN_SUFFIXES):
+                    continue
+                if member.size > current_app.config['IMPORT_MAX_NOTE_BYTES']:
+                    raise ValueError(f'{member.name} 超过单篇笔记大小上限')
+                yield title_from_path(member.name), decode_note(archive.extractfile(member).read(), member.name), None
+    elif lower.endswith(NDJSON_SUFFIXES):
+        max_bytes = current_app.config['IMPORT_MAX_NOTE_BYTES']
+        # JSON 转义后一个字节最多变成 6 个字符（\u00XX），按此上限读取，超长的行不整行读入内存
+        max_line = max_bytes * 6 + 4096
+        for lineno, raw in enumerate(iter(lambda: fileobj.readline(max_line + 1), b''), 1):
+            if len(raw) > max_line:
+                raise ValueError(f'第 {lineno} 行超过单篇笔记大小上限')
+            try:
+                line = raw.decode('utf-8-sig')
+            except UnicodeDecodeError:
+                raise ValueError(f'第 {lineno} 行不是 UTF-8 编码')
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                raise ValueError(f'第 {lineno} 行不是合法的 JSON')
+            if not isinstance(record, dict) or not isinstance(record.get('content'), str):
+                raise ValueError(f'第 {lineno} 行缺少 content 字段或 content 不是字符串')
+            if len(record['content'].encode('utf-8', 'surrogatepass')) > max_bytes:
+                raise ValueError(f'第 {lineno} 行超过单篇笔记大小上限')
+            is_public = record.get('is_public')
+            if is_public is not None and not isinstance(is_public, bool):
+                raise ValueError(f'第 {lineno} 行的 is_public 必须是 true 或 false')
+            title = str(record.get('title') or '').strip()[:150] or '未命名笔记'
+            yield title, record['content'], is_public
+    elif lower.endswith(MARKDOWN_SUFFIXES):
+        yield title_from_path(filename), decode_note(fileobj.read(), filename), None
+    else:
+        raise ValueError('仅支持 .zip、.tar(.gz/.bz2/.xz)、.ndjson/.jsonl 或 .md 文件')
+
+def import_notes(user_id, records, is_public=False):
+    """分批插入笔记，每批一次 executemany 并提交，返回导入数量"""
+    batch_size = current_app.config['IMPORT_BATCH_SIZE']
+    statement = db.insert(Note)
+    batch = []
+    count = 0
+    for title, content, public in records:
+        batch.append({'title': title, 'content': content, 'user_id': user_id,
+                      'is_public': is_public if public is None else public})
+        if len(batch) >= batch_size:
+            db.session.execute(statement, batch)
+            db.session.commit()
+            count += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(statement, batch)
+        db.session.commit()
+        count += len(batch)
+    return count
+
+def iter_user_notes(user_id):
+    """按批次从数据库读取用户笔记，不一次性加载全部内容"""
+    return Note.query.filter_by(user_id=user_id).order_by(Note.id).yield_per(100)
+
+class StreamBuffer(io.RawIOBase):
+    """不可 seek 的写缓冲，zipfile 会改用数据描述符，写完一项即可取出字节发送"""
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def iter_export_zip(user_id):
+    """逐篇写入 zip 并立即产出已压缩的字节，内存占用与笔记总量无关"""
+    buffer = StreamBuffer()
+    used_names = set()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for note in iter_user_notes(user_id):
+            base = UNSAFE_FILENAME_RE.sub('_', note.title).strip() or '未命名笔记'
+            name = base + '.md'
+            counter = 2
+            while name in used_names:
+                name = f'{base} ({counter}).md'
+                counter += 1
+            used_names.add(name)
+            info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(info, note.content)
+            yield buffer.pop()
+    yield buffer.pop()
+
+def iter_export_ndjson(user_id):
+    """逐篇输出 NDJSON，每行一个笔记对象"""
+    for note in iter_user_notes(user_id):
+        record = {'title': note.title, 'content': note.content, 'is_public': note.is_public}
+        yield (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+
+EXPORT_FORMATS = {
+    'zip': (iter_export_zip, 'application/zip'),
+    'ndjson': (iter_export_ndjson, 'application/x-ndjson'),
+}
+
 def login_required(f):
     """装饰器：检查登录，未登录重定向"""
     from functools import wraps
@@ -48,21 +961,21 @@ def login_required(f):
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
             flash("请先登录")
-            return redirect(url_for('login'))
+            return redirect(url_for('.login'))
         return f(*args, **kwargs)
     return decorated_function
 
 # ----------------------------------
 # 路由定义
 # ----------------------------------
-@app.route('/')
+@bp.route('/')
 def index():
     if 'user_id' in session:
-        return redirect(url_for('notes'))
+        return redirect(url_for('.notes'))
     else:
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         username = request.form.get('username', '').strip()
@@ -70,51 +983,55 @@ def register():
         password2 = request.form.get('password2', '').strip()
         if not username or not password or not password2:
             flash('请完整填写表单')
-            return redirect(url_for('register'))
+            return redirect(url_for('.register'))
         if password != password2:
             flash('两次密码输入不匹配')
-            return redirect(url_for('register'))
+            return redirect(url_for('.register'))
         if User.query.filter_by(username=username).first():
             flash('用户名已被注册')
-            return redirect(url_for('register'))
-        password_hash = generate_password_hash(password)
+            return redirect(url_for('.register'))
+        with timed('password_hash'):
+            password_hash = generate_password_hash(password)
         user = User(username=username, password_hash=password_hash)
         db.session.add(user)
         db.session.commit()
         flash('注册成功，请登录')
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
     return render_template_string(REGISTER_HTML)
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form.get('username', '').strip()
         password = request.form.get('password', '').strip()
         user = User.query.filter_by(username=username).first()
-        if user and check_password_hash(user.password_hash, password):
+        with timed('password_check'):
+            password_ok = user is not None and check_password_hash(user.password_hash, password)
+        if password_ok:
+            session.regenerate()
             session['user_id'] = user.id
             session['username'] = user.username
             flash(f'{user.username}，欢迎回来！')
-            return redirect(url_for('notes'))
+            return redirect(url_for('.notes'))
         else:
             flash('用户名或密码错误')
-            return redirect(url_for('login'))
+            return redirect(url_for('.login'))
     return render_template_string(LOGIN_HTML)
 
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     session.clear()
     flash('已登出')
-    return redirect(url_for('login'))
+    return redirect(url_for('.login'))
 
-@app.route('/notes')
+@bp.route('/notes')
 @login_required
 def notes():
-    user = User.query.get(session['user_id'])
+    user = get_current_user()
     notes = user.notes
     return render_template_string(NOTES_HTML, user=user, notes=notes)
 
-@app.route('/notes/new', methods=['GET', 'POST'])
+@bp.route('/notes/new', methods=['GET', 'POST'])
 @login_required
 def new_note():
     if request.method == 'POST':
@@ -123,50 +1040,164 @@ def new_note():
         is_public = ('is_public' in request.form)
         if not title:
             flash('标题不能为空')
-            return redirect(url_for('new_note'))
+            return redirect(url_for('.new_note'))
         note = Note(title=title, content=content, user_id=session['user_id'], is_public=is_public)
         db.session.add(note)
+        db.session.flush()
+        record_revision(note, '')
         db.session.commit()
         flash('笔记创建成功')
-        return redirect(url_for('notes'))
-    return render_template_string(EDIT_NOTE_HTML, note=None, action_url=url_for('new_note'), page_title='新建笔记')
+        return redirect(url_for('.notes'))
+    return render_template_string(EDIT_NOTE_HTML, note=None, action_url=url_for('.new_note'), page_title='新建笔记')
 
-@app.route('/notes/<int:note_id>/edit', methods=['GET', 'POST'])
+@bp.route('/notes/<int:note_id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_note(note_id):
     note = Note.query.get_or_404(note_id)
     if note.user_id != session['user_id']:
         flash('无权编辑该笔记')
-        return redirect(url_for('notes'))
+        return redirect(url_for('.notes'))
     if request.method == 'POST':
         title = request.form.get('title', '').strip()
         content = request.form.get('content', '').strip()
         is_public = ('is_public' in request.form)
         if not title:
             flash('标题不能为空')
-            return redirect(url_for('edit_note', note_id=note_id))
+            return redirect(url_for('.edit_note', note_id=note_id))
+        old_content, old_title = note.content, note.title
+        content_changed = (content != old_content or title != old_title)
         note.title = title
         note.content = content
         note.is_public = is_public
-        db.session.commit()
+        if content_changed:
+            record_revision(note, old_content, old_title)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # 另一个请求同时保存了同一篇笔记，版本号冲突
+            db.session.rollback()
+            flash('笔记已被其他请求修改，请刷新后重新编辑')
+            return redirect(url_for('.edit_note', note_id=note_id))
         flash('笔记保存成功')
-        return redirect(url_for('notes'))
-    return render_template_string(EDIT_NOTE_HTML, note=note, action_url=url_for('edit_note', note_id=note.id), page_title='编辑笔记')
+        return redirect(url_for('.notes'))
+    return render_template_string(EDIT_NOTE_HTML, note=note, action_url=url_for('.edit_note', note_id=note.id), page_title='编辑笔记')
 
-@app.route('/notes/<int:note_id>')
+@bp.route('/notes/<int:note_id>')
 @login_required
 def view_note(note_id):
+    """查看笔记；Accept 为 application/json 时返回正文和当前版本号，作为 PATCH 的 base_revision"""
     note = Note.query.get_or_404(note_id)
     is_owner = (note.user_id == session['user_id'])
-    html_content = Markup(markdown.markdown(note.content, extensions=['extra', 'codehilite']))
+    if request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json':
+        if not (is_owner or note.is_public):
+            return jsonify(error='该笔记为私密，仅作者可见'), 403
+        # 正文与版本号用同一条 SELECT 读取，避免两次查询之间被其他请求保存
+        number = db.select(db.func.coalesce(db.func.max(NoteRevision.number), 0)).where(
+            NoteRevision.note_id == Note.id).scalar_subquery()
+        title, content, is_public, revision = db.session.execute(
+            db.select(Note.title, Note.content, Note.is_public, number).where(Note.id == note.id)).one()
+        return jsonify(id=note.id, title=title, content=content, is_public=is_public, revision=revision)
+    html_content = render_markdown(note.content)
     if not is_owner:
         if not note.is_public:
             flash('该笔记为私密，仅作者可见')
-            return redirect(url_for('notes'))
+            return redirect(url_for('.notes'))
         flash('您正在查看他人笔记，只读模式')
     return render_template_string(VIEW_NOTE_HTML, note=note, html_content=html_content, is_owner=is_owner)
 
-@app.route('/search', methods=['GET', 'POST'])
+@bp.route('/notes/<int:note_id>', methods=['PATCH'])
+@login_required
+def patch_note(note_id):
+    """增量保存：请求体为 JSON {"base_revision": n, "ops": [[起始行, 结束行, [新行...]], ...]}，
+    可选 title / is_public。base_revision 与当前版本不一致时返回 409"""
+    note = Note.query.get_or_404(note_id)
+    if note.user_id != session['user_id']:
+        return jsonify(error='无权编辑该笔记'), 403
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify(error='请求体必须是 JSON 对象'), 400
+    last = latest_revision(note.id)
+    current = last.number if last else 0
+    if payload.get('base_revision') != current:
+        return jsonify(error='笔记已被修改，请基于最新版本重新提交', revision=current), 409
+    old_content, old_title = note.content, note.title
+    try:
+        content = apply_line_delta(old_content, payload.get('ops', []))
+    except (ValueError, TypeError) as e:
+        return jsonify(error=str(e)), 400
+    title = payload.get('title', note.title)
+    if not isinstance(title, str) or not title.strip():
+        return jsonify(error='标题不能为空'), 400
+    if 'is_public' in payload:
+        if not isinstance(payload['is_public'], bool):
+            return jsonify(error='is_public 必须是 true 或 false'), 400
+        note.is_public = payload['is_public']
+    changed = (content != old_content or title.strip() != note.title)
+    note.title = title.strip()
+    note.content = content
+    if changed:
+        current = record_revision(note, old_content, old_title).number
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # 并发请求基于同一版本提交，后提交的一方插入同一版本号失败
+        db.session.rollback()
+        return jsonify(error='笔记已被修改，请基于最新版本重新提交', revision=latest_revision(note_id).number), 409
+    return jsonify(id=note.id, revision=current)
+
+@bp.route('/notes/<int:note_id>/revisions')
+@login_required
+def note_revisions(note_id):
+    note = Note.query.get_or_404(note_id)
+    if note.user_id != session['user_id']:
+        flash('无权查看该笔记的历史版本')
+        return redirect(url_for('.notes'))
+    revisions = NoteRevision.query.filter_by(note_id=note.id).order_by(NoteRevision.number.desc()).all()
+    return render_template_string(REVISIONS_HTML, note=note, revisions=revisions)
+
+@bp.route('/notes/<int:note_id>/revisions/<int:number>')
+@login_required
+def view_revision(note_id, number):
+    note = Note.query.get_or_404(note_id)
+    if note.user_id != session['user_id']:
+        flash('无权查看该笔记的历史版本')
+        return redirect(url_for('.notes'))
+    NoteRevision.query.filter_by(note_id=note.id, number=number).first_or_404()
+    content = revision_content(note.id, number)
+    flash(f'您正在查看第 {number} 版，只读模式')
+    return render_template_string(VIEW_NOTE_HTML, note=note, html_content=render_markdown(content), is_owner=False)
+
+@bp.route('/notes/import', methods=['GET', 'POST'])
+@login_required
+def import_notes_view():
+    if request.method == 'POST':
+        upload = request.files.get('archive')
+        if upload is None or not upload.filename:
+            flash('请选择要导入的文件')
+            return redirect(url_for('.import_notes_view'))
+        is_public = ('is_public' in request.form)
+        try:
+            count = import_notes(session['user_id'], iter_import_records(upload.stream, upload.filename), is_public)
+        except (ValueError, zipfile.BadZipFile, tarfile.TarError) as e:
+            db.session.rollback()
+            flash(f'导入失败：{e}（此前的批次已保存）')
+            return redirect(url_for('.import_notes_view'))
+        flash(f'成功导入 {count} 篇笔记')
+        return redirect(url_for('.notes'))
+    return render_template_string(IMPORT_HTML)
+
+@bp.route('/notes/export')
+@login_required
+def export_notes_view():
+    fmt = request.args.get('format', 'zip')
+    if fmt not in EXPORT_FORMATS:
+        abort(400)
+    generator, mimetype = EXPORT_FORMATS[fmt]
+    filename = f"notes-{session['username']}.{fmt}"
+    return Response(stream_with_context(generator(session['user_id'])), mimetype=mimetype,
+                    headers={'Content-Disposition': f"attachment; filename*=UTF-8''{quote(filename)}"})
+
+@bp.route('/search', methods=['GET', 'POST'])
 @login_required
 def search():
     query = ''
@@ -175,7 +1206,7 @@ def search():
         query = request.form.get('username', '').strip()
         if not query:
             flash('请输入要搜索的用户名')
-            return redirect(url_for('search'))
+            return redirect(url_for('.search'))
         users = User.query.filter(User.username != session['username']).all()
 
         scored_users = []
@@ -194,30 +1225,410 @@ def search():
             flash('无匹配用户')
     return render_template_string(SEARCH_HTML, query=query, results=results)
 
-@app.route('/users/<int:user_id>/notes/<int:note_id>')
+@bp.route('/users/<int:user_id>/notes/<int:note_id>')
 @login_required
 def view_others_note(user_id, note_id):
     if user_id == session['user_id']:
-        return redirect(url_for('view_note', note_id=note_id))
+        return redirect(url_for('.view_note', note_id=note_id))
     user = User.query.get_or_404(user_id)
     note = Note.query.get_or_404(note_id)
     if note.user_id != user.id:
         flash('笔记不属于该用户')
-        return redirect(url_for('search'))
+        return redirect(url_for('.search'))
     if not note.is_public:
         flash('该笔记为私密，仅作者可见')
-        return redirect(url_for('search'))
-    html_content = Markup(markdown.markdown(note.content, extensions=['extra', 'codehilite']))
+        return redirect(url_for('.search'))
+    current_app.extensions['view_counter'].add(note.id)
+    html_content = render_markdown(note.content)
     flash(f'您正在查看 {user.username} 的笔记，只读模式')
     return render_template_string(VIEW_NOTE_HTML, note=note, html_content=html_content, is_owner=False)
 
+@bp.route('/discover')
+@login_required
+def discover():
+    # 排行表由后台线程定期重算，这里只读物化结果
+    current_app.extensions['view_counter'].start()
+    return render_template_string(DISCOVER_HTML, feed=load_feed())
+
+# ----------------------------------
+# JSON API（/api/v1，请求头 Authorization: Bearer <令牌>）
+# ----------------------------------
+NOTE_FIELDS = ('id', 'title', 'content', 'html', 'is_public', 'user_id')
+DEFAULT_NOTE_FIELDS = ('id', 'title', 'content', 'is_public', 'user_id')
+
+def api_error(status, message):
+    return jsonify(error=message), status
+
+def hash_token(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def token_required(f):
+    """装饰器：校验 Bearer 令牌，通过后 g.api_user_id 为令牌所属用户"""
+    from functools import wraps
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not token:
+            return api_error(401, '缺少访问令牌')
+        api_token = ApiToken.query.filter_by(token_hash=hash_token(token.strip())).first()
+        if api_token is None:
+            return api_error(401, '访问令牌无效')
+        g.api_user_id = api_token.user_id
+        g.api_token = api_token
+        return f(*args, **kwargs)
+    return decorated_function
+
+def parse_fields(allowed, default):
+    """解析 ?fields=a,b,c，未指定时返回默认字段"""
+    raw = request.args.get('fields')
+    if not raw:
+        return default
+    fields = tuple(dict.fromkeys(f.strip() for f in raw.split(',') if f.strip()))
+    unknown = [f for f in fields if f not in allowed]
+    if unknown or not fields:
+        raise ValueError(f"未知字段：{', '.join(unknown)}，可选：{', '.join(allowed)}")
+    return fields
+
+def parse_int_arg(name, default=None, minimum=0, maximum=None):
+    raw = request.args.get(name)
+    if raw is None or raw == '':
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise ValueError(f'参数 {name} 必须是整数')
+    if value < minimum or (maximum is not None and value > maximum):
+        raise ValueError(f'参数 {name} 超出范围')
+    return value
+
+def parse_ids():
+    """解析 ?ids=1,2,3，保持顺序并去重"""
+    try:
+        ids = list(dict.fromkeys(int(i) for i in request.args['ids'].split(',') if i.strip()))
+    except ValueError:
+        raise ValueError('ids 必须是逗号分隔的整数')
+    if len(ids) > current_app.config['API_MAX_IDS']:
+        raise ValueError(f"ids 最多 {current_app.config['API_MAX_IDS']} 个")
+    return ids
+
+def paginate(query, model, cursor, limit):
+    """按主键游标分页：返回本页数据和下一页游标（没有更多时为 None）"""
+    if cursor is not None:
+        query = query.filter(model.id > cursor)
+    items = query.order_by(model.id).limit(limit + 1).all()
+    next_cursor = str(items[limit - 1].id) if len(items) > limit else None
+    return items[:limit], next_cursor
+
+def note_query(fields):
+    """只从数据库加载所选字段需要的列，不需要正文时不读取 content"""
+    columns = {'title', 'is_public', 'user_id'} & set(fields)
+    if 'content' in fields or 'html' in fields:
+        columns.add('content')
+    return Note.query.options(load_only(*(getattr(Note, c) for c in columns or ('id',))))
+
+def note_to_dict(note, fields):
+    data = {}
+    for field in fields:
+        data[field] = str(render_markdown(note.content)) if field == 'html' else getattr(note, field)
+    return data
+
+def visible_to(user_id):
+    """API 用户可见的笔记：自己的笔记或他人公开的笔记"""
+    return db.or_(Note.user_id == user_id, Note.is_public.is_(True))
+
+def login_throttle_keys(username):
+    """失败次数分别按客户端 IP 和用户名计数"""
+    return {f'ip:{request.remote_addr}': current_app.config['API_LOGIN_MAX_FAILURES_PER_IP'],
+            f'user:{username.lower()[:150]}': current_app.config['API_LOGIN_MAX_FAILURES']}
+
+def login_retry_after(keys):
+    """窗口内失败次数达到上限时返回需要等待的秒数，否则返回 0"""
+    now = time.time()
+    window = current_app.config['API_LOGIN_WINDOW']
+    rows = db.session.execute(db.select(LoginFailure).where(
+        LoginFailure.key.in_(list(keys)), LoginFailure.window_start > now - window)).scalars().all()
+    waits = [row.window_start + window - now for row in rows if row.failures >= keys[row.key]]
+    return int(max(waits)) + 1 if waits else 0
+
+def record_login_failure(keys):
+    """累加失败次数，窗口过期的计数从 1 重新开始；记录保存在数据库中，多个工作进程共享"""
+    now = time.time()
+    expired = LoginFailure.window_start <= now - current_app.config['API_LOGIN_WINDOW']
+    db.session.execute(db.delete(LoginFailure).where(expired))
+    for key in keys:
+        stmt = upsert(LoginFailure).values(key=key, failures=1, window_start=now)
+        stmt = stmt.on_conflict_do_update(index_elements=['key'], set_={
+            'failures': db.case((expired, 1), else_=LoginFailure.failures + 1),
+            'window_start': db.case((expired, now), else_=LoginFailure.window_start)})
+        db.session.execute(stmt)
+    db.session.commit()
+
+@bp.route('/api/v1/tokens', methods=['POST'])
+def api_create_token():
+    """用户名密码换取访问令牌，令牌明文只在此返回一次"""
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return api_error(400, '请求体必须是 JSON 对象')
+    username = str(payload.get('username', '')).strip()
+    password = str(payload.get('password', '')).strip()
+    keys = login_throttle_keys(username)
+    retry_after = login_retry_after(keys)
+    if retry_after:
+        return jsonify(error='密码错误次数过多，请稍后再试'), 429, {'Retry-After': str(retry_after)}
+    user = User.query.filter_by(username=username).first()
+    with timed('password_check'):
+        password_ok = user is not None and check_password_hash(user.password_hash, password)
+    if not password_ok:
+        record_login_failure(keys)
+        return api_error(401, '用户名或密码错误')
+    token = secrets.token_urlsafe(32)
+    db.session.add(ApiToken(user_id=user.id, token_hash=hash_token(token)))
+    db.session.commit()
+    return jsonify(token=token, user_id=user.id), 201
+
+@bp.route('/api/v1/tokens/current', methods=['DELETE'])
+@token_required
+def api_revoke_token():
+    db.session.delete(g.api_token)
+    db.session.commit()
+    return '', 204
+
+@bp.route('/api/v1/notes')
+@token_required
+def api_list_notes():
+    """?ids=1,2,3 一次 IN 查询批量获取；否则按游标分页列出自己（或 ?user_id= 指定用户公开）的笔记"""
+    try:
+        fields = parse_fields(NOTE_FIELDS, DEFAULT_NOTE_FIELDS)
+        if 'ids' in request.args:
+            ids = parse_ids()
+            found = {n.id: n for n in note_query(fields).filter(Note.id.in_(ids), visible_to(g.api_user_id))}
+            return jsonify(data=[note_to_dict(found[i], fields) for i in ids if i in found],
+                           missing=[i for i in ids if i not in found])
+        user_id = parse_int_arg('user_id', g.api_user_id)
+        cursor = parse_int_arg('cursor')
+        limit = parse_int_arg('limit', 20, 1, current_app.config['API_MAX_LIMIT'])
+    except ValueError as e:
+        return api_error(400, str(e))
+    query = note_query(fields).filter(Note.user_id == user_id)
+    if user_id != g.api_user_id:
+        query = query.filter(Note.is_public.is_(True))
+    items, next_cursor = paginate(query, Note, cursor, limit)
+    return jsonify(data=[note_to_dict(n, fields) for n in items], next_cursor=next_cursor)
+
+@bp.route('/api/v1/notes/<int:note_id>')
+@token_required
+def api_get_note(note_id):
+    try:
+        fields = parse_fields(NOTE_FIELDS, DEFAULT_NOTE_FIELDS)
+    except ValueError as e:
+        return api_error(400, str(e))
+    note = note_query(fields).filter(Note.id == note_id, visible_to(g.api_user_id)).first()
+    if note is None:
+        return api_error(404, '笔记不存在或无权访问')
+    return jsonify(data=note_to_dict(note, fields))
+
+# ----------------------------------
+# 发现页：浏览计数缓冲与排行表
+# ----------------------------------
+def upsert(model):
+    """返回支持 ON CONFLICT 的 INSERT，SQLite 与 PostgreSQL 的写法相同"""
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
+@timed('flush_views')
+def flush_views(counts):
+    """把 {note_id: 次数} 一次性累加到当前小时的计数行"""
+    hour = int(time.time() // 3600)
+    stmt = upsert(NoteViewBucket)
+    stmt = stmt.on_conflict_do_update(index_elements=['note_id', 'hour'],
+                                      set_={'views': NoteViewBucket.views + stmt.excluded.views})
+    db.session.execute(stmt, [{'note_id': k, 'hour': hour, 'views': v} for k, v in counts.items()])
+    db.session.commit()
+
+def claim_feed_refresh(min_interval):
+    """距上次重算不足 min_interval 秒时返回 False；否则更新 feed_state 占住本轮重算。
+    条件 UPDATE 持有行锁直到提交，并发的进程或定时任务会等待后看到新时间，因而跳过或排队执行"""
+    now = time.time()
+    refreshed_at = db.session.execute(db.select(FeedState.refreshed_at).where(FeedState.id == 1)).scalar()
+    if refreshed_at is not None and refreshed_at > now - min_interval:
+        return False
+    db.session.execute(upsert(FeedState).values(id=1, refreshed_at=0).on_conflict_do_nothing())
+    claimed = db.session.execute(db.update(FeedState).where(
+        FeedState.id == 1, FeedState.refreshed_at <= now - min_interval).values(refreshed_at=now)).rowcount
+    if not claimed:
+        db.session.rollback()
+    return bool(claimed)
+
+@timed('refresh_feed')
+def refresh_feed(min_interval=0):
+    """清理过期计数，重算热门与最新榜单并整体替换排行表；min_interval 秒内已有其他进程重算过时直接返回 False"""
+    size = current_app.config['FEED_SIZE']
+    since = int(time.time() // 3600) - current_app.config['FEED_WINDOW_HOURS']
+    if not claim_feed_refresh(min_interval):
+        return False
+    db.session.execute(db.delete(NoteViewBucket).where(NoteViewBucket.hour <= since))
+    views = db.func.sum(NoteViewBucket.views).label('views')
+    popular = db.session.execute(
+        db.select(NoteViewBucket.note_id, views)
+        .join(Note, Note.id == NoteViewBucket.note_id).where(Note.is_public)
+        .group_by(NoteViewBucket.note_id).order_by(views.desc(), NoteViewBucket.note_id.desc()).limit(size)).all()
+    recent = db.session.execute(
+        db.select(Note.id).where(Note.is_public).order_by(Note.id.desc()).limit(size)).scalars().all()
+    recent_views = dict(db.session.execute(
+        db.select(NoteViewBucket.note_id, views)
+        .where(NoteViewBucket.note_id.in_(recent)).group_by(NoteViewBucket.note_id)).all()) if recent else {}
+    rows = [{'feed': 'popular', 'position': i, 'note_id': note_id, 'views': count}
+            for i, (note_id, count) in enumerate(popular)]
+    rows += [{'feed': 'recent', 'position': i, 'note_id': note_id, 'views': recent_views.get(note_id, 0)}
+             for i, note_id in enumerate(recent)]
+    db.session.execute(db.delete(FeedEntry))
+    if rows:
+        db.session.execute(db.insert(FeedEntry), rows)
+    db.session.commit()
+    return True
+
+def load_feed():
+    """一次按主键顺序读出两个榜单，联表过滤掉已删除或已改为私密的笔记"""
+    feed = {'popular': [], 'recent': []}
+    rows = db.session.execute(
+        db.select(FeedEntry.feed, FeedEntry.views, Note.id, Note.title, User.id, User.username)
+        .join(Note, Note.id == FeedEntry.note_id).join(User, User.id == Note.user_id)
+        .where(Note.is_public).order_by(FeedEntry.feed, FeedEntry.position)).all()
+    for name, views, note_id, title, user_id, username in rows:
+        feed[name].append({'note_id': note_id, 'title': title, 'user_id': user_id,
+                           'username': username, 'views': views})
+    return feed
+
+class ViewCounter:
+    """浏览次数先在内存中累加，后台线程每隔 VIEW_FLUSH_INTERVAL 秒批量写入，并按 FEED_REFRESH_INTERVAL 刷新排行表"""
+    def __init__(self, app):
+        self.app = app
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = None
+
+    def add(self, note_id):
+        with self._lock:
+            self._counts[note_id] += 1
+            self._start()
+
+    def start(self):
+        with self._lock:
+            self._start()
+
+    def _start(self):
+        if self._thread is None:
+            self._stopped = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(self._stopped,), daemon=True)
+            self._thread.start()
+            atexit.register(self._flush_at_exit)
+
+    # 停止后台线程并写入剩余计数，之后不再在解释器退出时写库（数据库所在目录可能已被删除）
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._stopped.set()
+                atexit.unregister(self._flush_at_exit)
+        if thread is not None:
+            thread.join()
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+        if not counts:
+            return
+        with self.app.app_context():
+            try:
+                flush_views(counts)
+            except Exception:
+                db.session.rollback()
+                with self._lock:
+                    self._counts.update(counts)  # 写入失败时放回缓冲区，下一轮重试
+                raise
+
+    def _run(self, stopped):
+        while not stopped.wait(self.app.config['VIEW_FLUSH_INTERVAL']):
+            try:
+                self.flush()
+                interval = self.app.config['FEED_REFRESH_INTERVAL']
+                if interval:
+                    with self.app.app_context():
+                        refresh_feed(interval)
+            except Exception:
+                self.app.logger.exception('写入浏览计数或刷新排行表失败')
+
+    def _flush_at_exit(self):
+        try:
+            self.flush()
+        except Exception:
+            self.app.logger.exception('退出时写入浏览计数失败')
+
+# ----------------------------------
+# 命令行（flask --app notepad <命令>）
+# ----------------------------------
+def init_db():
+    """创建数据库表和会话表，需在应用上下文中调用"""
+    db.create_all()
+    current_app.session_interface.store.setup()
+
+@bp.cli.command('init-db')
+def init_db_command():
+    """创建数据库表（首次部署或新增数据表后执行一次，应用启动时不再自动建表）"""
+    init_db()
+    click.echo('数据库表已创建')
+
+@bp.cli.command('refresh-feed')
+def refresh_feed_command():
+    """重算发现页排行表（FEED_REFRESH_INTERVAL 为 0 时由 cron 定时执行）"""
+    refresh_feed()
+    click.echo('排行表已刷新')
+
+@bp.cli.command('import-notes')
+@click.argument('username')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--public', is_flag=True, help='未指定公开状态的笔记设为公开')
+def import_notes_command(username, path, public):
+    """把 zip/tar/NDJSON/.md 文件中的笔记导入到指定用户"""
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f'用户不存在：{username}')
+    with open(path, 'rb') as f:
+        try:
+            count = import_notes(user.id, iter_import_records(f, path), public)
+        except (ValueError, zipfile.BadZipFile, tarfile.TarError) as e:
+            raise click.ClickException(f'导入失败：{e}（此前的批次已保存）')
+    click.echo(f'成功导入 {count} 篇笔记')
+
+@bp.cli.command('export-notes')
+@click.argument('username')
+@click.argument('path', type=click.Path(dir_okay=False, writable=True, allow_dash=True))
+@click.option('--format', 'fmt', type=click.Choice(sorted(EXPORT_FORMATS)), default=None,
+              help='导出格式，默认按文件扩展名判断')
+def export_notes_command(username, path, fmt):
+    """把指定用户的全部笔记流式导出为 zip 或 NDJSON（PATH 为 - 时写到标准输出）"""
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f'用户不存在：{username}')
+    if fmt is None:
+        fmt = 'ndjson' if path.lower().endswith(NDJSON_SUFFIXES) else 'zip'
+    generator = EXPORT_FORMATS[fmt][0]
+    with click.open_file(path, 'wb') as f:
+        for chunk in generator(user.id):
+            f.write(chunk)
+
 # ----------------------------------
 # 模板字符串（Bootstrap 5  + MathJax + 代码高亮 + 公开复选）
 # ----------------------------------
 NAVBAR_HTML = '''
 <nav class="navbar navbar-expand-lg navbar-dark bg-primary mb-4">
   <div class="container-fluid">
-    <a class="navbar-brand" href="{{ url_for('notes') }}">Markdown笔记本</a>
+    <a class="navbar-brand" href="{{ url_for('.notes') }}">Markdown笔记本</a>
     <button class="navbar-toggler" type="button" data-bs-toggle="collapse" 
             data-bs-target="#navbarSupportedContent" aria-controls="navbarSupportedContent" 
             aria-expanded="false" aria-label="切换导航">
@@ -226,12 +1637,14 @@ NAVBAR_HTML = '''
     {% if session.get('username') %}
     <div class="collapse navbar-collapse" id="navbarSupportedContent">
       <ul class="navbar-nav me-auto mb-2 mb-lg-0">
-        <li class="nav-item"><a class="nav-link" href="{{ url_for('notes') }}">我的笔记</a></li>
-        <li class="nav-item"><a class="nav-link" href="{{ url_for('new_note') }}">新建笔记</a></li>
-        <li class="nav-item"><a class="nav-link" href="{{ url_for('search') }}">搜索用户</a></li>
+        <li class="nav-item"><a class="nav-link" href="{{ url_for('.notes') }}">我的笔记</a></li>
+        <li class="nav-item"><a class="nav-link" href="{{ url_for('.new_note') }}">新建笔记</a></li>
+        <li class="nav-item"><a class="nav-link" href="{{ url_for('.import_notes_view') }}">导入/导出</a></li>
+        <li class="nav-item"><a class="nav-link" href="{{ url_for('.search') }}">搜索用户</a></li>
+        <li class="nav-item"><a class="nav-link" href="{{ url_for('.discover') }}">发现</a></li>
       </ul>
       <span class="navbar-text me-3">登录用户：{{ session['username'] }}</span>
-      <a class="btn btn-outline-light btn-sm" href="{{ url_for('logout') }}">登出</a>
+      <a class="btn btn-outline-light btn-sm" href="{{ url_for('.logout') }}">登出</a>
     </div>
     {% endif %}
   </div>
@@ -271,7 +1684,7 @@ LOGIN_HTML = '''
         </div>
         <button type="submit" class="btn btn-primary w-100">登录</button>
       </form>
-      <p class="text-center mt-3">没有账号？<a href="{{ url_for('register') }}">注册</a></p>
+      <p class="text-center mt-3">没有账号？<a href="{{ url_for('.register') }}">注册</a></p>
     </div>
     <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
   </body>
@@ -315,7 +1728,7 @@ REGISTER_HTML = '''
         </div>
         <button type="submit" class="btn btn-primary w-100">注册</button>
       </form>
-      <p class="text-center mt-3">已有账号？<a href="{{ url_for('login') }}">去登录</a></p>
+      <p class="text-center mt-3">已有账号？<a href="{{ url_for('.login') }}">去登录</a></p>
     </div>
     <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
   </body>
@@ -346,11 +1759,11 @@ NOTES_HTML = '''
       {% endwith %}
 
       {% if notes|length == 0 %}
-        <div class="alert alert-secondary my-3">暂无笔记，<a href="{{ url_for('new_note') }}">点击新建</a>吧！</div>
+        <div class="alert alert-secondary my-3">暂无笔记，<a href="{{ url_for('.new_note') }}">点击新建</a>吧！</div>
       {% else %}
         <div class="list-group mb-3">
           {% for note in notes %}
-            <a href="{{ url_for('view_note', note_id=note.id) }}" 
+            <a href="{{ url_for('.view_note', note_id=note.id) }}" 
                class="list-group-item list-group-item-action d-flex justify-content-between align-items-center">
               {{ note.title }}
               <span>
@@ -359,7 +1772,7 @@ NOTES_HTML = '''
                 {% else %}
                   <span class="badge bg-secondary me-2">私密</span>
                 {% endif %}
-                <a href="{{ url_for('edit_note', note_id=note.id) }}" class="btn btn-outline-secondary btn-sm">编辑</a>
+                <a href="{{ url_for('.edit_note', note_id=note.id) }}" class="btn btn-outline-secondary btn-sm">编辑</a>
               </span>
             </a>
           {% endfor %}
@@ -410,7 +1823,7 @@ EDIT_NOTE_HTML = '''
           </label>
         </div>
         <button type="submit" class="btn btn-primary">{{ '保存' if note else '创建' }}</button>
-        <a href="{{ url_for('notes') }}" class="btn btn-secondary ms-2">返回</a>
+        <a href="{{ url_for('.notes') }}" class="btn btn-secondary ms-2">返回</a>
       </form>
     </div>
     <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
@@ -459,9 +1872,10 @@ VIEW_NOTE_HTML = '''
       {% endwith %}
       <hr>
       <div class="markdown-content mb-3">{{ html_content|safe }}</div>
-      <a href="{{ url_for('notes') }}" class="btn btn-secondary">返回</a>
+      <a href="{{ url_for('.notes') }}" class="btn btn-secondary">返回</a>
       {% if is_owner %}
-        <a href="{{ url_for('edit_note', note_id=note.id) }}" class="btn btn-primary ms-2">编辑</a>
+        <a href="{{ url_for('.edit_note', note_id=note.id) }}" class="btn btn-primary ms-2">编辑</a>
+        <a href="{{ url_for('.note_revisions', note_id=note.id) }}" class="btn btn-outline-secondary ms-2">历史版本</a>
       {% endif %}
     </div>
     <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
@@ -517,7 +1931,7 @@ SEARCH_HTML = '''
                 <ul class="mt-2">
                   {% for note in public_notes %}
                     <li>
-                      <a href="{{ url_for('view_others_note', user_id=user.id, note_id=note.id) }}">
+                      <a href="{{ url_for('.view_others_note', user_id=user.id, note_id=note.id) }}">
                         {{ note.title }}
                       </a>
                     </li>
@@ -528,7 +1942,128 @@ SEARCH_HTML = '''
           {% endfor %}
         </ul>
       {% endif %}
-      <p class="mt-4"><a href="{{ url_for('notes') }}">返回我的笔记</a></p>
+      <p class="mt-4"><a href="{{ url_for('.notes') }}">返回我的笔记</a></p>
+    </div>
+    <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
+  </body>
+</html>
+'''
+
+DISCOVER_HTML = '''
+<!doctype html>
+<html lang="zh-CN">
+  <head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1">
+    <title>发现 - Markdown笔记本</title>
+    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
+  </head>
+  <body>
+    ''' + NAVBAR_HTML + '''
+    <div class="container mt-2" style="max-width: 1000px;">
+      <h2>发现公开笔记</h2>
+      <div class="row">
+        {% for name, heading in [('popular', '热门'), ('recent', '最新')] %}
+        <div class="col-md-6 mb-4">
+          <h4>{{ heading }}</h4>
+          {% if feed[name] %}
+            <ol class="list-group list-group-numbered">
+              {% for item in feed[name] %}
+                <li class="list-group-item d-flex justify-content-between align-items-start">
+                  <div class="ms-2 me-auto">
+                    <a href="{{ url_for('.view_others_note', user_id=item.user_id, note_id=item.note_id) }}">{{ item.title }}</a>
+                    <div class="text-muted small">{{ item.username }}</div>
+                  </div>
+                  <span class="badge bg-secondary rounded-pill">{{ item.views }} 次浏览</span>
+                </li>
+              {% endfor %}
+            </ol>
+          {% else %}
+            <p class="text-muted">暂无内容</p>
+          {% endif %}
+        </div>
+        {% endfor %}
+      </div>
+    </div>
+    <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
+  </body>
+</html>
+'''
+
+IMPORT_HTML = '''
+<!doctype html>
+<html lang="zh-CN">
+  <head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1">
+    <title>导入/导出 - Markdown笔记本</title>
+    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
+  </head>
+  <body>
+    ''' + NAVBAR_HTML + '''
+    <div class="container mt-2" style="max-width: 800px;">
+      <h2>批量导入</h2>
+      {% with messages = get_flashed_messages() %}
+        {% if messages %}
+          <div class="alert alert-danger" role="alert">
+            {% for msg in messages %}
+              <div>{{ msg }}</div>
+            {% endfor %}
+          </div>
+        {% endif %}
+      {% endwith %}
+      <form method="post" enctype="multipart/form-data" novalidate>
+        <div class="mb-3">
+          <label for="archive" class="form-label">文件（.zip / .tar.gz 中的 .md 文件，或 .ndjson，每行 {"title", "content", "is_public"}）</label>
+          <input type="file" name="archive" id="archive" class="form-control" required>
+        </div>
+        <div class="form-check mb-3">
+          <input class="form-check-input" type="checkbox" value="true" id="is_public" name="is_public">
+          <label class="form-check-label" for="is_public">未指定公开状态的笔记设为公开</label>
+        </div>
+        <button type="submit" class="btn btn-primary">导入</button>
+      </form>
+      <hr>
+      <h2>导出全部笔记</h2>
+      <a href="{{ url_for('.export_notes_view', format='zip') }}" class="btn btn-outline-primary">导出为 zip</a>
+      <a href="{{ url_for('.export_notes_view', format='ndjson') }}" class="btn btn-outline-primary ms-2">导出为 NDJSON</a>
+      <p class="mt-4"><a href="{{ url_for('.notes') }}">返回我的笔记</a></p>
+    </div>
+    <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
+  </body>
+</html>
+'''
+
+REVISIONS_HTML = '''
+<!doctype html>
+<html lang="zh-CN">
+  <head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1">
+    <title>{{ note.title }} 的历史版本 - Markdown笔记本</title>
+    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
+  </head>
+  <body>
+    ''' + NAVBAR_HTML + '''
+    <div class="container mt-2" style="max-width: 800px;">
+      <h2>{{ note.title }} 的历史版本</h2>
+      {% if revisions|length == 0 %}
+        <div class="alert alert-secondary my-3">暂无历史版本</div>
+      {% else %}
+        <div class="list-group mb-3">
+          {% for rev in revisions %}
+            <a href="{{ url_for('.view_revision', note_id=note.id, number=rev.number) }}"
+               class="list-group-item list-group-item-action d-flex justify-content-between align-items-center">
+              第 {{ rev.number }} 版：{{ rev.title }}
+              <span>
+                <span class="badge {{ 'bg-primary' if rev.is_snapshot else 'bg-light text-dark' }} me-2">{{ '快照' if rev.is_snapshot else '增量' }}</span>
+                <small class="text-muted">{{ rev.created_at.strftime('%Y-%m-%d %H:%M:%S') }}</small>
+              </span>
+            </a>
+          {% endfor %}
+        </div>
+      {% endif %}
+      <a href="{{ url_for('.view_note', note_id=note.id) }}" class="btn btn-secondary">返回</a>
     </div>
     <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
   </body>
@@ -536,8 +2071,35 @@ SEARCH_HTML = '''
 '''
 
 # ----------------------------------
-# 启动服务
+# 应用工厂
+# ----------------------------------
+def create_app(config=None):
+    """创建应用：默认配置 < FLASK_ 前缀的环境变量（如 FLASK_SQLALCHEMY_DATABASE_URI）< config 参数。
+    不建表、不导入 Markdown，工作进程创建后即可开始服务；建表请执行 flask --app notepad init-db"""
+    app = Flask(__name__)
+    app.config.update(DEFAULT_CONFIG)
+    app.config.from_prefixed_env()
+    if config:
+        app.config.update(config)
+    # 搜索结果模板中使用了 {% do %} 语句
+    app.jinja_env.add_extension('jinja2.ext.do')
+    db.init_app(app)
+    app.session_interface = ServerSideSessionInterface(make_session_store(app))
+    app.extensions['user_cache'] = UserCache()
+    app.extensions['render_cache'] = RenderCache(app.config['RENDER_CACHE_MAXSIZE'])
+    app.extensions['view_counter'] = ViewCounter(app)
+    before_render_template.connect(start_template_timer, app)
+    template_rendered.connect(record_template_timer, app)
+    app.register_blueprint(bp)
+    if app.config['MARKDOWN_WARMUP']:
+        threading.Thread(target=warm_up_markdown, daemon=True).start()
+    return app
+
+# ----------------------------------
+# 启动服务（开发用；生产环境请用 WSGI 服务器加载 notepad:create_app()）
 # ----------------------------------
 if __name__ == '__main__':
-    db.create_all()
+    app = create_app()
+    with app.app_context():
+        init_db()
     app.run(debug=False)
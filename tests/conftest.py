@@ -0,0 +1,36 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'video'))
+
+import notepad  # noqa: E402
+import app as video  # noqa: E402
+
+
+@pytest.fixture
+def notepad_app(tmp_path):
+    app = notepad.create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "notes.db"}',
+        'SESSION_SQLITE_PATH': str(tmp_path / 'sessions.db'),
+    })
+    with app.app_context():
+        notepad.init_db()
+        yield app
+
+
+@pytest.fixture
+def video_app(tmp_path):
+    app = video.create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "videos.db"}',
+        'SESSION_SQLITE_PATH': str(tmp_path / 'sessions.db'),
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+    })
+    with app.app_context():
+        video.init_db()
+        yield app
@@ -0,0 +1,38 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+import app as video
+import notepad
+
+
+@pytest.fixture(params=['notepad', 'video'])
+def api_client(request, notepad_app, video_app):
+    module, app = (notepad, notepad_app) if request.param == 'notepad' else (video, video_app)
+    with app.app_context():
+        module.db.session.add(module.User(username='alice', password_hash=generate_password_hash('secret')))
+        module.db.session.commit()
+    app.config['API_LOGIN_MAX_FAILURES'] = 3
+    return app.test_client()
+
+
+@pytest.mark.parametrize('body', [[1], 'text', 5, None])
+def test_token_request_must_be_json_object(api_client, body):
+    response = api_client.post('/api/v1/tokens', json=body)
+    assert response.status_code == 400
+
+
+def test_token_endpoint_throttles_password_guessing(api_client):
+    for _ in range(3):
+        assert api_client.post('/api/v1/tokens', json={'username': 'alice', 'password': 'guess'}).status_code == 401
+    response = api_client.post('/api/v1/tokens', json={'username': 'Alice', 'password': 'secret'})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) > 0
+    other = api_client.post('/api/v1/tokens', json={'username': 'bob', 'password': 'x'})
+    assert other.status_code == 401
+
+
+def test_token_endpoint_accepts_correct_password(api_client):
+    api_client.post('/api/v1/tokens', json={'username': 'alice', 'password': 'guess'})
+    response = api_client.post('/api/v1/tokens', json={'username': 'alice', 'password': 'secret'})
+    assert response.status_code == 201
+    assert response.get_json()['token']
@@ -0,0 +1,12 @@
+import notepad
+import app as video
+
+
+def test_config_argument_overrides_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv('FLASK_SQLALCHEMY_DATABASE_URI', f'sqlite:///{tmp_path / "env.db"}')
+    monkeypatch.setenv('FLASK_FEED_SIZE', '7')
+    uri = f'sqlite:///{tmp_path / "arg.db"}'
+    for module in (notepad, video):
+        app = module.create_app({'SQLALCHEMY_DATABASE_URI': uri, 'SESSION_BACKEND': 'memory'})
+        assert app.config['SQLALCHEMY_DATABASE_URI'] == uri
+        assert app.config['FEED_SIZE'] == 7
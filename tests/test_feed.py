@@ -0,0 +1,38 @@
+import atexit
+import time
+
+import notepad
+import app as video
+from notepad import FeedState, db
+
+
+def test_refresh_feed_skips_within_interval(notepad_app):
+    assert notepad.refresh_feed(60) is True
+    assert notepad.refresh_feed(60) is False
+    db.session.execute(db.update(FeedState).values(refreshed_at=time.time() - 120))
+    db.session.commit()
+    assert notepad.refresh_feed(60) is True
+    assert notepad.refresh_feed() is True
+
+
+def test_video_refresh_feed_skips_within_interval(video_app):
+    assert video.refresh_feed(60) is True
+    assert video.refresh_feed(60) is False
+    assert video.refresh_feed() is True
+
+
+def test_stop_flushes_and_unregisters(notepad_app, monkeypatch):
+    unregistered = []
+    real_unregister = atexit.unregister
+    monkeypatch.setattr(atexit, 'unregister', lambda func: (unregistered.append(func), real_unregister(func)))
+    counter = notepad_app.extensions['view_counter']
+    flushed = []
+    monkeypatch.setattr(notepad, 'flush_views', lambda counts: flushed.append(dict(counts)))
+    counter.add(7)
+    counter.add(7)
+    counter.stop()
+    assert flushed == [{7: 2}]
+    assert unregistered == [counter._flush_at_exit]
+    assert counter._thread is None
+    counter.stop()
+    assert flushed == [{7: 2}]
@@ -0,0 +1,36 @@
+import io
+
+import pytest
+
+from notepad import iter_import_records
+
+
+def records(text):
+    return list(iter_import_records(io.BytesIO(text.encode('utf-8')), 'notes.ndjson'))
+
+
+def test_ndjson_keeps_json_booleans(notepad_app):
+    assert records('{"title": "a", "content": "x", "is_public": false}\n'
+                   '{"title": "b", "content": "y", "is_public": true}\n'
+                   '{"title": "c", "content": "z"}\n') == [('a', 'x', False), ('b', 'y', True), ('c', 'z', None)]
+
+
+@pytest.mark.parametrize('line', [
+    '{"content": "x", "is_public": "false"}',
+    '{"content": "x", "is_public": 1}',
+    '{"title": "no content"}',
+    '{"content": 5}',
+    '[1]',
+])
+def test_ndjson_rejects_invalid_records(notepad_app, line):
+    with pytest.raises(ValueError):
+        records(line)
+
+
+def test_ndjson_rejects_oversized_notes(notepad_app):
+    notepad_app.config['IMPORT_MAX_NOTE_BYTES'] = 10
+    assert records('{"content": "0123456789"}\n') == [('未命名笔记', '0123456789', None)]
+    with pytest.raises(ValueError, match='第 1 行'):
+        records('{"content": "0123456789A"}\n')
+    with pytest.raises(ValueError, match='第 2 行'):
+        records('{"content": "x"}\n{"content": "' + 'x' * 10000 + '"}\n')
@@ -0,0 +1,72 @@
+import re
+import time
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+import app as video
+import notepad
+
+SAMPLE_RE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_][a-zA-Z0-9_]*="(\\.|[^"\\])*",?)*\})? \S+$')
+
+
+@pytest.fixture(params=['notepad', 'video'])
+def metrics_app(request, notepad_app, video_app):
+    module, app = (notepad, notepad_app) if request.param == 'notepad' else (video, video_app)
+    app.config['METRICS_ENABLED'] = True
+    return module, app
+
+
+def test_metrics_output_is_prometheus_text(metrics_app):
+    module, app = metrics_app
+    client = app.test_client()
+    assert client.get('/login').status_code == 200
+    with app.app_context():
+        module.db.session.execute(text('SELECT 1'))
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+    lines = response.get_data(as_text=True).splitlines()
+    for line in lines:
+        if line.startswith('#'):
+            assert re.match(r'^# (HELP \S+ .+|TYPE \S+ (histogram|counter))$', line), line
+        else:
+            assert SAMPLE_RE.match(line), line
+    assert any(line.startswith('http_request_duration_seconds_bucket{endpoint="main.login",method="GET",le="+Inf"}')
+               for line in lines)
+    assert any(line.startswith('sql_statement_duration_seconds_count{statement="SELECT"}') for line in lines)
+
+
+def test_metrics_disabled_returns_404(metrics_app):
+    module, app = metrics_app
+    app.config['METRICS_ENABLED'] = False
+    assert app.test_client().get('/metrics').status_code == 404
+
+
+def test_failed_statement_does_not_leak_sql_timer(metrics_app):
+    module, app = metrics_app
+    with app.app_context():
+        conn = module.db.session.connection()
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text('SELECT * FROM no_such_table'))
+            module.db.session.rollback()
+            conn = module.db.session.connection()
+        assert not conn.info.get('query_start')
+
+
+def test_slow_request_writes_folded_profile(metrics_app, tmp_path):
+    module, app = metrics_app
+    app.config.update(PROFILE_SLOW_REQUEST_MS=20, PROFILE_INTERVAL_MS=1, PROFILE_DIR=str(tmp_path / 'profiles'))
+
+    def slow():
+        time.sleep(0.1)
+        return 'ok'
+    app.add_url_rule('/slow', 'slow', slow)
+    assert app.test_client().get('/slow').status_code == 200
+    files = list((tmp_path / 'profiles').glob('*-slow-*ms.folded'))
+    assert len(files) == 1
+    lines = files[0].read_text(encoding='utf-8').splitlines()
+    assert lines and all(re.match(r'^\S.* \d+$', line) for line in lines)
+    assert any('slow (test_metrics.py:' in line for line in lines)
@@ -0,0 +1,97 @@
+import random
+
+import markdown
+import pytest
+
+import benchmark
+import notepad
+from notepad import CROSS_BLOCK_RE, render_markdown, split_blocks
+
+EDGE_CASES = [
+    '1. a\n\n2. b\n\n3. c\n\npara',
+    '- a\n\n    cont\n\n- b\n\nx',
+    '```\na\n\nb\n```\n\n$$\nx\n\ny\n$$\n\n> q\n\n> r\n\n    code\n\n    more\n\ntext',
+    '# H\npara\n## H2\n- a\n# H3\n> q\n# H4',
+    'para\n\n$$\n# not heading\n$$\n\n### x ###\ntext',
+    '<div>\n\nhello\n\n</div>\n\nafter',
+    'Setext\n======\n\ntext\n\n#\n\n#hashtag',
+    'Term\n:   def\n\n*[HTML]: Hyper\n\nHTML here',
+    'text[^1]\n\n[^1]: foot',
+    'See [x][ref]\n\n[ref]: https://example.com',
+    'Term\n: def\n\nTerm2\n: def2',
+    'Term\n\n: def\n\n: def b\n\n\nTerm3\n:   def3\n\npara after',
+    '<https://example.com>\n\npara',
+    '<span>inline</span>\n\npara',
+    '<!-- comment -->\n\npara',
+    '| a | b |\n|---|---|\n| 1 | 2 |\n\n~~~python\nprint(1)\n\n\nprint(2)\n~~~',
+    'Note:\n> tip one\n\n> tip two',
+    '```\ncode\n```\n- a\n\n- b',
+    '---\n- a\n\n- b',
+    ' > q\n\n > r',
+    '- a\n\n    code\n# H',
+    '| a | b |\n|---|---|\n| 1 | 2 |\n# H',
+    'Term\n: def\n\npara\n\n: def2',
+]
+
+# 随机拼接的片段覆盖块中段开始的列表/引用、缩进引用、围栏与分隔线后的列表、表格和定义列表
+FRAGMENTS = [
+    'para', 'Note:', 'lazy line', '- a', '- b', '* c', '+ plus', '- [ ] task', '1. one', '2) two',
+    '> q', ' > q', '   > q', '>> nested', '    code', '  indented', '---', '***', '# H', '## H2',
+    'Setext\n---', '```\ncode\n```', '~~~\nx\n\ny\n~~~', '$$\nx\n$$', 'Term\n: def', ': def',
+    '| a | b |\n|---|---|\n| 1 | 2 |',
+]
+
+
+def reference(text):
+    return markdown.markdown(text, extensions=notepad.MARKDOWN_EXTENSIONS)
+
+
+def normalize(html):
+    return str(html).replace('\n', '')
+
+
+@pytest.mark.parametrize('text', EDGE_CASES)
+def test_block_rendering_matches_whole_document(notepad_app, text):
+    assert normalize(render_markdown(text)) == normalize(reference(text))
+
+
+def test_synthetic_documents_match_whole_document(notepad_app):
+    rng = random.Random(1)
+    for _ in range(20):
+        text = benchmark.make_markdown(rng, 8)
+        assert normalize(render_markdown(text)) == normalize(reference(text))
+
+
+def test_random_fragments_match_whole_document(notepad_app):
+    rng = random.Random(2)
+    for _ in range(1500):
+        text = ''.join(rng.choice(FRAGMENTS) + rng.choice(['\n', '\n\n', '\n\n\n'])
+                       for _ in range(rng.randint(2, 6)))
+        assert normalize(render_markdown(text)) == normalize(reference(text)), text
+
+
+def test_repeated_render_is_served_from_cache(notepad_app):
+    text = '# a\n\npara one\n\npara two'
+    first = render_markdown(text)
+    cache = notepad_app.extensions['render_cache']
+    size = len(cache._data)
+    assert render_markdown(text + '\n\npara three').startswith(first)
+    assert len(cache._data) == size + 1
+
+
+def test_definition_list_after_blank_line_stays_in_one_block():
+    assert split_blocks('Term\n: def\n\nTerm2\n: def2\n\npara') == ['Term\n: def\n\nTerm2\n: def2', 'para']
+    assert split_blocks('Term\n\n: def') == ['Term\n\n: def']
+
+
+@pytest.mark.parametrize('text, whole', [
+    ('<https://example.com>', False),
+    ('<span>x</span>', False),
+    ('<div>x</div>', True),
+    ('  <TABLE>', True),
+    ('<!-- c -->', True),
+    ('<pretty>', False),
+    ('[ref]: https://example.com', True),
+])
+def test_cross_block_detection(text, whole):
+    assert bool(CROSS_BLOCK_RE.search(text)) is whole
@@ -0,0 +1,119 @@
+import sqlite3
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+import notepad
+from notepad import Note, NoteRevision, User, apply_line_delta, db, make_line_delta, record_revision, revision_content
+
+PAIRS = [
+    ('', ''),
+    ('', 'a\nb'),
+    ('a\nb\nc', ''),
+    ('a\nb\nc', 'a\nB\nc\nd'),
+    ('line1\nline2\n', 'line0\nline1\nline2\n\n'),
+    ('x\ny\nz', 'z\ny\nx'),
+]
+
+
+@pytest.mark.parametrize('old, new', PAIRS)
+def test_line_delta_round_trip(old, new):
+    assert apply_line_delta(old, make_line_delta(old, new)) == new
+
+
+@pytest.mark.parametrize('ops', [
+    [[2, 1, []]],
+    [[0, 1, ['a']], [0, 1, ['b']]],
+    [[0, 9, []]],
+    [[0, 1, 'a']],
+    [['0', 1, []]],
+])
+def test_apply_line_delta_rejects_invalid_ops(ops):
+    with pytest.raises(ValueError):
+        apply_line_delta('a\nb\nc', ops)
+
+
+def make_note(content='', title='T'):
+    user = User(username='alice', password_hash=generate_password_hash('pw'))
+    db.session.add(user)
+    db.session.flush()
+    note = Note(title=title, content=content, user_id=user.id, is_public=False)
+    db.session.add(note)
+    db.session.commit()
+    return note
+
+
+def save(note, content):
+    old = note.content
+    note.content = content
+    revision = record_revision(note, old)
+    db.session.commit()
+    return revision
+
+
+def test_revision_content_across_snapshots(notepad_app):
+    notepad_app.config['REVISION_SNAPSHOT_INTERVAL'] = 3
+    note = make_note()
+    versions = []
+    text = '\n'.join(f'line {i}' for i in range(40))
+    for i in range(10):
+        text = text.replace(f'line {i}', f'edited {i}') + f'\nappended {i}'
+        versions.append(text)
+        save(note, text)
+    revisions = NoteRevision.query.filter_by(note_id=note.id).order_by(NoteRevision.number).all()
+    assert [r.number for r in revisions if r.is_snapshot] == [1, 4, 7, 10]
+    for number, expected in enumerate(versions, start=1):
+        assert revision_content(note.id, number) == expected
+
+
+def test_first_edit_of_note_without_history_keeps_original(notepad_app):
+    note = make_note('imported body', title='Imported')
+    revision = save(note, 'imported body\nedited')
+    assert revision.number == 2
+    first = NoteRevision.query.filter_by(note_id=note.id, number=1).one()
+    assert first.is_snapshot and first.title == 'Imported'
+    assert revision_content(note.id, 1) == 'imported body'
+    assert revision_content(note.id, 2) == 'imported body\nedited'
+
+
+def test_concurrent_patch_returns_conflict(notepad_app, monkeypatch):
+    note = make_note('a\nb')
+    save(note, 'a\nb\nc')
+    client = notepad_app.test_client()
+    client.post('/login', data={'username': 'alice', 'password': 'pw'})
+    stale = notepad.latest_revision(note.id)
+    db_path = db.engine.url.database
+
+    def latest_revision_after_race(note_id):
+        # 模拟另一个请求在版本检查之后抢先保存了版本 2
+        if not NoteRevision.query.filter_by(note_id=note_id, number=2).count():
+            with sqlite3.connect(db_path) as conn:
+                conn.execute('INSERT INTO note_revision (note_id, number, title, is_snapshot, data, created_at) '
+                             "VALUES (?, 2, 'T', 1, 'other', '2024-01-01')", (note_id,))
+        return stale
+
+    monkeypatch.setattr(notepad, 'latest_revision', latest_revision_after_race)
+    response = client.patch(f'/notes/{note.id}', json={'base_revision': 1, 'ops': [[0, 1, ['A']]]})
+    assert response.status_code == 409
+
+
+def test_json_view_returns_revision_for_patch(notepad_app):
+    note = make_note('a\nb')
+    save(note, 'a\nb\nc')
+    client = notepad_app.test_client()
+    client.post('/login', data={'username': 'alice', 'password': 'pw'})
+    data = client.get(f'/notes/{note.id}', headers={'Accept': 'application/json'}).get_json()
+    assert data['content'] == 'a\nb\nc' and data['revision'] == 2
+    response = client.patch(f'/notes/{note.id}', json={'base_revision': data['revision'], 'ops': [[2, 3, ['C']]]})
+    assert response.get_json()['revision'] == 3
+    assert client.get(f'/notes/{note.id}').mimetype == 'text/html'
+
+
+def test_patch_rejects_non_boolean_is_public(notepad_app):
+    note = make_note('a')
+    client = notepad_app.test_client()
+    client.post('/login', data={'username': 'alice', 'password': 'pw'})
+    response = client.patch(f'/notes/{note.id}', json={'base_revision': 0, 'ops': [], 'is_public': 'false'})
+    assert response.status_code == 400
+    db.session.refresh(note)
+    assert note.is_public is False
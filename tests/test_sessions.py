@@ -0,0 +1,117 @@
+import os
+import sqlite3
+import time
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+import app as video
+import notepad
+
+
+@pytest.fixture(params=['notepad', 'video'])
+def module(request):
+    return notepad if request.param == 'notepad' else video
+
+
+@pytest.fixture(params=['notepad', 'video'])
+def login_client(request, notepad_app, video_app):
+    """返回 (模块, 应用, 登录函数)；视频平台登录前先在会话中放入验证码"""
+    module, app = (notepad, notepad_app) if request.param == 'notepad' else (video, video_app)
+    with app.app_context():
+        module.db.session.add(module.User(username='alice', password_hash=generate_password_hash('pw')))
+        module.db.session.commit()
+    client = app.test_client()
+
+    def login():
+        if module is video:
+            with client.session_transaction() as sess:
+                sess['captcha'] = 'abcd'
+        return client.post('/login', data={'username': 'alice', 'password': 'pw', 'captcha': 'abcd'})
+    return module, app, client, login
+
+
+def test_memory_store_evicts_anonymous_sessions_separately(module):
+    store = module.MemorySessionStore(maxsize=2, anonymous_maxsize=2)
+    expires = time.time() + 60
+    store.set('u1', 'a', expires)
+    store.set('u2', 'b', expires)
+    for sid in ('x1', 'x2', 'x3'):
+        store.set(sid, 'anon', expires, anonymous=True)
+    assert store.get('x1') is None
+    assert store.get('u1') == 'a' and store.get('u2') == 'b'
+    store.get('u1')  # u1 最近访问过，u2 先被淘汰
+    store.set('u3', 'c', expires)
+    assert store.get('u2') is None
+    assert store.get('u1') == 'a' and store.get('u3') == 'c'
+    store.set('x3', 'logged in', expires)  # 登录后从匿名池移到已登录池
+    assert store.get('x3') == 'logged in' and 'x3' not in store._anonymous
+
+
+def test_memory_store_drops_expired_sessions(module):
+    store = module.MemorySessionStore()
+    store.set('old', 'a', time.time() - 1)
+    assert store.get('old') is None
+
+
+def test_sqlite_store_expires_and_purges(module, tmp_path):
+    path = str(tmp_path / 'sessions.db')
+    store = module.SqliteSessionStore(path, purge_interval=3600)
+    store.setup()
+    store.set('live', 'a', time.time() + 60)
+    store.set('stale', 'b', time.time() - 1)
+    assert store.get('live') == 'a'
+    assert store.get('stale') is None
+    store.set('expired', 'c', time.time() - 1)
+    store.set('other', 'd', time.time() + 60)  # 清理间隔未到，过期行仍在
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("SELECT count(*) FROM sessions WHERE sid = 'expired'").fetchone()[0] == 1
+    store._next_purge = 0
+    store.set('other', 'd', time.time() + 60)
+    with sqlite3.connect(path) as conn:
+        assert [r[0] for r in conn.execute('SELECT sid FROM sessions ORDER BY sid')] == ['live', 'other']
+
+
+def test_create_app_does_not_create_session_database(module, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    app = module.create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "app.db"}'})
+    store = app.session_interface.store
+    assert store.path == os.path.join(app.instance_path, 'sessions.db')
+    assert getattr(store._local, 'conn', None) is None
+    assert not (tmp_path / 'sessions.db').exists()
+
+
+def test_login_regenerates_session_id(login_client):
+    module, app, client, login = login_client
+    client.get('/captcha' if module is video else '/notes')  # 产生一个匿名会话
+    before = client.get_cookie('session').value
+    old_sid = app.session_interface._signer(app).unsign(before).decode()
+    assert app.session_interface.store.get(old_sid) is not None
+    login()
+    after = client.get_cookie('session').value
+    assert after != before
+    assert app.session_interface.store.get(old_sid) is None
+
+
+def test_cookie_only_sent_for_new_sessions(login_client):
+    module, app, client, login = login_client
+    response = login()
+    assert 'Set-Cookie' in response.headers
+    response = client.get('/')
+    assert 'Set-Cookie' not in response.headers
+
+
+def test_user_cache_invalidated_on_update(login_client):
+    module, app, client, login = login_client
+    cache = app.extensions['user_cache']
+    with app.app_context():
+        user_id = module.User.query.filter_by(username='alice').one().id
+        assert cache.get(user_id).username == 'alice'
+        assert user_id in cache._data
+    with app.app_context():
+        assert cache.get(user_id).username == 'alice'
+        user = module.db.session.get(module.User, user_id)
+        user.username = 'alice2'
+        module.db.session.commit()
+        assert user_id not in cache._data
+        assert cache.get(user_id).username == 'alice2'
@@ -0,0 +1,85 @@
+import io
+
+import pytest
+
+import app as video
+from app import LocalStorage
+
+DATA = bytes(range(256)) * 20
+
+
+def exercise(storage):
+    storage.setup()
+    key = 'alice/clip.mp4'
+    assert not storage.exists(key)
+    storage.put(key, io.BytesIO(DATA), 'video/mp4')
+    assert storage.exists(key)
+    assert storage.size(key) == len(DATA)
+    assert b''.join(storage.get(key)) == DATA
+    assert b''.join(storage.get(key, 10, 19)) == DATA[10:20]
+    assert b''.join(storage.get(key, len(DATA) - 5)) == DATA[-5:]
+    storage.delete(key)
+    assert not storage.exists(key)
+    storage.delete(key)
+
+
+def test_local_storage(tmp_path):
+    exercise(LocalStorage(str(tmp_path / 'uploads')))
+
+
+def test_local_storage_rejects_keys_outside_root(tmp_path):
+    storage = LocalStorage(str(tmp_path / 'uploads'))
+    with pytest.raises(ValueError):
+        storage.put('../escape.mp4', io.BytesIO(b''))
+
+
+def test_local_storage_accel_redirect(tmp_path, video_app):
+    storage = LocalStorage(str(tmp_path / 'uploads'), accel_prefix='/protected/')
+    storage.put('alice/a b.mp4', io.BytesIO(DATA))
+    with video_app.test_request_context():
+        response = storage.send('alice/a b.mp4', 'video/mp4')
+    assert response.headers['X-Accel-Redirect'] == '/protected/alice/a%20b.mp4'
+    assert response.get_data() == b''
+
+
+@pytest.fixture
+def s3_storage():
+    moto = pytest.importorskip('moto')
+    with moto.mock_aws():
+        yield video.S3Storage('videos', region='us-east-1', access_key='test', secret_key='test', redirect=False)
+
+
+def test_s3_storage(s3_storage):
+    exercise(s3_storage)
+
+
+@pytest.mark.parametrize('header, status, body', [
+    (None, 200, DATA),
+    ('bytes=10-19', 206, DATA[10:20]),
+    ('bytes=-5', 206, DATA[-5:]),
+    ('bytes=0-1,5-6', 200, DATA),
+])
+def test_s3_storage_send(s3_storage, video_app, header, status, body):
+    s3_storage.setup()
+    s3_storage.put('alice/clip.mp4', io.BytesIO(DATA), 'video/mp4')
+    headers = {'Range': header} if header else {}
+    with video_app.test_request_context(headers=headers):
+        response = s3_storage.send('alice/clip.mp4', 'video/mp4')
+        assert response.status_code == status
+        assert b''.join(response.response) == body
+        assert response.content_length == len(body)
+
+
+def test_s3_storage_send_unsatisfiable_range(s3_storage, video_app):
+    s3_storage.setup()
+    s3_storage.put('alice/clip.mp4', io.BytesIO(DATA))
+    with video_app.test_request_context(headers={'Range': f'bytes={len(DATA) + 10}-'}):
+        response = s3_storage.send('alice/clip.mp4')
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(DATA)}'
+
+
+def test_s3_storage_presigned_url(s3_storage):
+    s3_storage.redirect = True
+    url = s3_storage.url('alice/clip.mp4', 60)
+    assert 'alice/clip.mp4' in url and 'X-Amz-Signature' in url
@@ -1,20 +1,242 @@
+import atexit
+import hashlib
+import mimetypes
 import os
 import random
+import secrets
+import shutil
+import sqlite3
 import string
-from flask import (Flask, render_template, request, redirect, url_for, session,
-                   flash, send_from_directory, abort)
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.parse import quote
+import click
+from flask import (Flask, Blueprint, current_app, has_app_context, render_template, request, redirect, url_for, session,
+                   flash, send_from_directory, abort, g, Response, jsonify,
+                   before_render_template, template_rendered)
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from itsdangerous import BadSignature, Signer
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import load_only
+from werkzeug.datastructures import CallbackDict
+from werkzeug.exceptions import NotFound
+from werkzeug.security import generate_password_hash, check_password_hash, safe_join
 from werkzeug.utils import secure_filename
 
-app = Flask(__name__)
-app.secret_key = 'your-secret-key'  # 实际部署请换更安全的随机密钥
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///videos.db'  # 设置数据库URI，使用sqlite数据库文件
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False  # 关闭轨迹修改，提升性能
-app.config['UPLOAD_FOLDER'] = 'uploads'  # 视频上传目录
-app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 最大上传限制500MB
+# 应用由 create_app() 创建，数据库扩展、路由、钩子和命令行都挂在蓝图上按需注册
+db = SQLAlchemy()  # 创建数据库实例，在 create_app 中绑定应用
+bp = Blueprint('main', __name__, cli_group=None)
 
-db = SQLAlchemy(app)  # 创建数据库实例
+DEFAULT_CONFIG = {
+    'SECRET_KEY': 'your-secret-key',  # 实际部署请换更安全的随机密钥
+    'SQLALCHEMY_DATABASE_URI': 'sqlite:///videos.db',  # 设置数据库URI，使用sqlite数据库文件
+    'SQLALCHEMY_TRACK_MODIFICATIONS': False,  # 关闭轨迹修改，提升性能
+    'UPLOAD_FOLDER': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads'),  # local 后端的视频目录，与 send_from_directory 使用同一基准路径
+    'STORAGE_BACKEND': 'local',  # 视频文件存储后端：local（本地目录）或 s3（S3兼容对象存储，多节点共享，需安装 boto3）
+    'STORAGE_LOCAL_ACCEL_PREFIX': None,  # 设置后返回 X-Accel-Redirect 头，由 nginx 的 internal location 直接发送文件
+    'STORAGE_S3_BUCKET': 'videos',  # 对象存储桶名
+    'STORAGE_S3_ENDPOINT_URL': None,  # MinIO 等兼容服务的地址，如 http://127.0.0.1:9000；None 表示 AWS S3
+    'STORAGE_S3_REGION': None,  # 区域，None 时使用 boto3 默认配置
+    'STORAGE_S3_ACCESS_KEY': None,  # 访问密钥，None 时使用 boto3 默认凭证链（环境变量、配置文件、实例角色）
+    'STORAGE_S3_SECRET_KEY': None,
+    'STORAGE_S3_REDIRECT': True,  # 为真时播放请求重定向到预签名URL，视频字节不经过应用；为假时由应用按Range分段转发
+    'STORAGE_URL_EXPIRES': 3600,  # 预签名URL有效秒数
+    'VIEW_FLUSH_INTERVAL': 10,  # 播放次数在内存中累积多少秒后批量写入数据库
+    'FEED_REFRESH_INTERVAL': 60,  # 发现页排行表重算间隔秒数，所有工作进程合计每个间隔只重算一次；0 表示只用 flask refresh-feed 命令刷新
+    'FEED_WINDOW_HOURS': 72,  # 热门榜统计最近多少小时的播放次数
+    'FEED_SIZE': 30,  # 热门/最新两个榜单各保留多少条
+    'MAX_CONTENT_LENGTH': 500 * 1024 * 1024,  # 最大上传限制500MB
+    'SESSION_BACKEND': 'sqlite',  # 会话存储后端：sqlite（多进程共享）或 memory（进程内LRU，只适用于单进程部署）
+    'SESSION_SQLITE_PATH': 'sessions.db',  # sqlite 后端使用的数据库文件，相对路径位于实例目录（instance/）下
+    'SESSION_MEMORY_MAXSIZE': 10000,  # memory 后端最多保留的已登录会话数
+    'SESSION_ANONYMOUS_LIFETIME': 1800,  # 未登录会话（验证码、提示消息）的有效秒数
+    'SESSION_ANONYMOUS_MAXSIZE': 10000,  # memory 后端最多保留的未登录会话数，单独淘汰，不会挤掉已登录会话
+    'METRICS_ENABLED': False,  # 开启后在 /metrics 以 Prometheus 文本格式输出性能指标
+    'PROFILE_SLOW_REQUEST_MS': 0,  # 超过该毫秒数的请求写出调用栈采样（flamegraph折叠格式），0表示关闭
+    'PROFILE_INTERVAL_MS': 5,  # 调用栈采样间隔
+    'PROFILE_DIR': 'profiles',  # 采样结果输出目录
+    'API_MAX_IDS': 100,  # JSON API 单次批量查询的最大ID数
+    'API_MAX_LIMIT': 100,  # JSON API 分页大小上限
+    'API_LOGIN_WINDOW': 900,  # 令牌接口没有验证码，按该窗口秒数统计密码错误次数
+    'API_LOGIN_MAX_FAILURES': 5,  # 窗口内同一用户名最多错误次数，超过返回 429
+    'API_LOGIN_MAX_FAILURES_PER_IP': 50,  # 窗口内同一 IP 最多错误次数
+    'WARMUP': False,  # 为真时在后台线程预先编译页面模板，避免首个请求承担编译耗时
+}
+
+# ---------- 性能指标与慢请求采样分析（默认关闭） ----------
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 按标签分组的直方图，输出 Prometheus 文本格式
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                labels = ','.join(f'{k}="{escape_label(v)}"' for k, v in key)
+                prefix = labels + ',' if labels else ''
+                for bound, c in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {c}')
+                lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+                lines.append(f'{self.name}_sum{{{labels}}} {total}')
+                lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return lines
+
+# 转义 Prometheus 标签值中的特殊字符
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', '每个路由的请求耗时')
+SQL_LATENCY = Histogram('sql_statement_duration_seconds', 'SQL语句执行耗时，按语句类型分组')
+FUNCTION_LATENCY = Histogram('function_duration_seconds', '热点函数耗时（LCS、密码哈希）')
+TEMPLATE_LATENCY = Histogram('template_render_duration_seconds', '模板渲染耗时')
+ALL_METRICS = (REQUEST_LATENCY, SQL_LATENCY, FUNCTION_LATENCY, TEMPLATE_LATENCY)
+
+# 记录代码块耗时，也可作为装饰器使用，未开启指标时不做任何事
+@contextmanager
+def timed(name):
+    if not (has_app_context() and current_app.config['METRICS_ENABLED']):
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        FUNCTION_LATENCY.observe(time.perf_counter() - start, name=name)
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_sql_timer(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context() and current_app.config['METRICS_ENABLED']:
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_sql_timer(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start')
+    if starts:
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'UNKNOWN'
+        SQL_LATENCY.observe(time.perf_counter() - starts.pop(), statement=verb)
+
+# 语句执行出错时不会触发 after_cursor_execute，丢弃其开始时间，避免在连接池的连接上越积越多
+@event.listens_for(Engine, 'handle_error')
+def discard_sql_timer(context):
+    starts = context.connection.info.get('query_start') if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+def start_template_timer(sender, template, context, **extra):
+    if current_app.config['METRICS_ENABLED']:
+        g.template_start = time.perf_counter()
+
+def record_template_timer(sender, template, context, **extra):
+    start = g.pop('template_start', None)
+    if start is not None:
+        TEMPLATE_LATENCY.observe(time.perf_counter() - start, template=template.name or 'string')
+
+# 把调用栈转换为 flamegraph 折叠格式（根在前，分号分隔）
+def fold_stack(frame):
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(parts))
+
+# 后台线程定时采样正在处理请求的线程的调用栈
+class StackSampler:
+    def __init__(self):
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def begin(self, interval):
+        with self._lock:
+            self._active[threading.get_ident()] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(interval,), daemon=True)
+                self._thread.start()
+
+    def end(self):
+        with self._lock:
+            return self._active.pop(threading.get_ident(), None)
+
+    def _run(self, interval):
+        while True:
+            time.sleep(interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for ident, stacks in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stacks[fold_stack(frame)] += 1
+
+stack_sampler = StackSampler()
+
+# 把慢请求的采样结果写成 .folded 文件，可直接交给 flamegraph.pl / speedscope
+def dump_profile(stacks, endpoint, elapsed):
+    os.makedirs(current_app.config['PROFILE_DIR'], exist_ok=True)
+    filename = f'{int(time.time() * 1000)}-{endpoint}-{int(elapsed * 1000)}ms.folded'
+    with open(os.path.join(current_app.config['PROFILE_DIR'], filename), 'w', encoding='utf-8') as f:
+        for stack, count in stacks.most_common():
+            f.write(f'{stack} {count}\n')
+
+@bp.before_app_request
+def start_request_timer():
+    if current_app.config['METRICS_ENABLED'] or current_app.config['PROFILE_SLOW_REQUEST_MS']:
+        g.request_start = time.perf_counter()
+    if current_app.config['PROFILE_SLOW_REQUEST_MS']:
+        stack_sampler.begin(current_app.config['PROFILE_INTERVAL_MS'] / 1000)
+
+@bp.teardown_app_request
+def record_request_timer(exc):
+    start = g.pop('request_start', None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    endpoint = request.endpoint or 'unknown'
+    if current_app.config['METRICS_ENABLED']:
+        REQUEST_LATENCY.observe(elapsed, endpoint=endpoint, method=request.method)
+    if current_app.config['PROFILE_SLOW_REQUEST_MS']:
+        stacks = stack_sampler.end()
+        if stacks and elapsed * 1000 >= current_app.config['PROFILE_SLOW_REQUEST_MS']:
+            dump_profile(stacks, endpoint, elapsed)
+
+# Prometheus 指标接口，未开启时返回404
+@bp.route('/metrics')
+def metrics():
+    if not current_app.config['METRICS_ENABLED']:
+        abort(404)
+    lines = []
+    for histogram in ALL_METRICS:
+        lines.extend(histogram.render())
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
 
 # 用户模型，包含用户名和密码哈希，及与视频的一对多关联
 class User(db.Model):
@@ -23,10 +245,12 @@ class User(db.Model):
     password_hash = db.Column(db.String(128), nullable=False)  # 密码哈希存储
     videos = db.relationship('Video', backref='owner', lazy=True)  # 关联用户的视频列表
 
+    @timed('password_hash')
     def set_password(self, password):
         # 生成密码哈希，PBKDF2+SHA256算法，salt长度16
         self.password_hash = generate_password_hash(password, method='pbkdf2:sha256', salt_length=16)
 
+    @timed('password_check')
     def check_password(self, password):
         # 验证密码，比较输入密码与存储哈希是否匹配
         return check_password_hash(self.password_hash, password)
@@ -39,12 +263,44 @@ class Video(db.Model):
     visible = db.Column(db.Boolean, default=True)  # 是否公开可见
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)  # 所属用户外键
 
+# 按小时汇总的视频播放次数，hour 为 Unix 时间戳整除 3600
+class VideoViewBucket(db.Model):
+    video_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    hour = db.Column(db.Integer, primary_key=True, autoincrement=False, index=True)
+    views = db.Column(db.Integer, nullable=False)
+
+# 只有一行，记录排行表上次重算的时间；重算前先抢占这一行，多个工作进程不会重复重算
+class FeedState(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    refreshed_at = db.Column(db.Float, nullable=False)
+
+# 物化的发现页排行表：feed 为 popular（热门）或 recent（最新），position 为名次
+class FeedEntry(db.Model):
+    feed = db.Column(db.String(10), primary_key=True)
+    position = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    video_id = db.Column(db.Integer, nullable=False)
+    views = db.Column(db.Integer, nullable=False)
+
+# API访问令牌，只保存令牌的SHA-256摘要
+class ApiToken(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)  # 令牌所属用户
+    token_hash = db.Column(db.String(64), unique=True, nullable=False)  # 令牌摘要
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+# 令牌接口的密码错误计数，key 为 ip:<地址> 或 user:<用户名>
+class LoginFailure(db.Model):
+    key = db.Column(db.String(200), primary_key=True)
+    failures = db.Column(db.Integer, nullable=False)
+    window_start = db.Column(db.Float, nullable=False)  # 当前计数窗口的开始时间（Unix 时间戳）
+
 # 判断是否为允许的视频文件扩展
 def allowed_file(filename):
     allowed_extensions = {'mp4', 'avi', 'mov', 'mkv', 'webm'}  # 允许的视频格式集合
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
 
 # 计算两个字符串的最长公共子序列长度
+@timed('lcs_length')
 def lcs_length(a, b):
     m, n = len(a), len(b)
     dp = [[0]*(n+1) for _ in range(m+1)]  # 初始化dp表
@@ -59,35 +315,418 @@ def lcs_length(a, b):
 
 from functools import wraps
 
+# 服务端会话对象，内容修改时自动标记 modified
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.old_sid = None
+
+    def regenerate(self):
+        # 更换会话ID，登录时调用防止会话固定攻击
+        self.old_sid = self.sid
+        self.sid = uuid.uuid4().hex
+        self.new = True
+        self.modified = True
+
+# 进程内LRU会话存储，超出容量淘汰最久未访问的会话
+class MemorySessionStore:
+    def __init__(self, maxsize=10000, anonymous_maxsize=10000):
+        self.maxsize = maxsize
+        self.anonymous_maxsize = anonymous_maxsize
+        self._data = OrderedDict()
+        self._anonymous = OrderedDict()  # 未登录会话单独淘汰，大量匿名请求不会挤掉已登录会话
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        with self._lock:
+            for data in (self._data, self._anonymous):
+                item = data.get(sid)
+                if item is None:
+                    continue
+                expires, value = item
+                if expires < time.time():
+                    del data[sid]
+                    return None
+                data.move_to_end(sid)
+                return value
+            return None
+
+    def set(self, sid, value, expires, anonymous=False):
+        with self._lock:
+            data, other, maxsize = ((self._anonymous, self._data, self.anonymous_maxsize) if anonymous
+                                    else (self._data, self._anonymous, self.maxsize))
+            other.pop(sid, None)
+            data[sid] = (expires, value)
+            data.move_to_end(sid)
+            while len(data) > maxsize:
+                data.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+            self._anonymous.pop(sid, None)
+
+    def setup(self):
+        pass
+
+# SQLite会话存储，每个线程独立连接，多进程可共享同一数据库文件
+class SqliteSessionStore:
+    def __init__(self, path, purge_interval=60):
+        self.path = path
+        self.purge_interval = purge_interval
+        self._next_purge = 0.0
+        self._local = threading.local()
+
+    # 创建会话表，由 init-db 调用；创建应用时不连接数据库
+    def setup(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')  # 多进程读写时读不阻塞写
+        conn.execute('CREATE TABLE IF NOT EXISTS sessions ('
+                     'sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL NOT NULL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires)')
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            self._local.conn = conn
+        return conn
+
+    def get(self, sid):
+        conn = self._conn()
+        row = conn.execute('SELECT data, expires FROM sessions WHERE sid = ?', (sid,)).fetchone()
+        if row is None:
+            return None
+        if row[1] < time.time():
+            self.delete(sid)
+            return None
+        return row[0]
+
+    def set(self, sid, value, expires, anonymous=False):
+        conn = self._conn()
+        conn.execute('INSERT OR REPLACE INTO sessions (sid, data, expires) VALUES (?, ?, ?)',
+                     (sid, value, expires))
+        # 过期会话不会再被读取，写入时顺带按间隔批量清理
+        now = time.time()
+        if now >= self._next_purge:
+            self._next_purge = now + self.purge_interval
+            conn.execute('DELETE FROM sessions WHERE expires < ?', (now,))
+        conn.commit()
+
+    def delete(self, sid):
+        conn = self._conn()
+        conn.execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+        conn.commit()
+
+# 根据 SESSION_BACKEND 配置创建会话存储后端
+def make_session_store(app):
+    backend = app.config['SESSION_BACKEND']
+    if backend == 'memory':
+        return MemorySessionStore(app.config['SESSION_MEMORY_MAXSIZE'], app.config['SESSION_ANONYMOUS_MAXSIZE'])
+    if backend == 'sqlite':
+        # 相对路径放在实例目录下，不依赖启动时的工作目录
+        return SqliteSessionStore(os.path.join(app.instance_path, app.config['SESSION_SQLITE_PATH']))
+    raise ValueError(f'未知的会话存储后端：{backend}')
+
+# 会话数据（含验证码）保存在服务端，Cookie只存签名后的会话ID
+# 只有会话内容变化时才写存储，只有新会话才下发Cookie
+class ServerSideSessionInterface(SessionInterface):
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store):
+        self.store = store
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='server-side-session')
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+            if sid:
+                data = self.store.get(sid)
+                if data is not None:
+                    return ServerSession(self.serializer.loads(data), sid=sid)
+        return ServerSession(sid=uuid.uuid4().hex, new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.old_sid:
+            self.store.delete(session.old_sid)
+        if not session:
+            # 会话被清空（如登出），删除服务端数据和Cookie
+            if not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app))
+            return
+        if session.modified or session.new:
+            # 未登录的会话（验证码、提示消息）只保留较短时间
+            anonymous = 'user_id' not in session
+            lifetime = (app.config['SESSION_ANONYMOUS_LIFETIME'] if anonymous
+                        else app.permanent_session_lifetime.total_seconds())
+            self.store.set(session.sid, self.serializer.dumps(dict(session)), time.time() + lifetime, anonymous)
+        if session.new:
+            response.set_cookie(name, self._signer(app).sign(session.sid).decode(),
+                                expires=self.get_expiration_time(app, session),
+                                httponly=self.get_cookie_httponly(app),
+                                domain=domain, path=path,
+                                secure=self.get_cookie_secure(app),
+                                samesite=self.get_cookie_samesite(app))
+
+# 缓存已脱离数据库会话的User对象，避免每个请求都按主键查询，用户修改或删除时失效
+class UserCache:
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            user = self._data.get(user_id)
+            if user is not None:
+                self._data.move_to_end(user_id)
+        if user is None:
+            user = db.session.get(User, user_id)
+            if user is None:
+                return None
+            db.session.expunge(user)
+            with self._lock:
+                self._data[user_id] = user
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        # load=False 直接把缓存状态挂到当前数据库会话，不发SELECT
+        return db.session.merge(user, load=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._data.pop(user_id, None)
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def invalidate_cached_user(mapper, connection, target):
+    if has_app_context():
+        current_app.extensions['user_cache'].invalidate(target.id)
+
+# ---------- 视频文件存储后端（本地目录或S3兼容对象存储） ----------
+# 两种后端接口相同：setup/exists/size/put/get/delete/url/send，对象键为“用户名/文件名”
+STORAGE_CHUNK_SIZE = 1024 * 1024
+
+def video_key(username, filename):
+    return f'{username}/{filename}'
+
+def video_mimetype(filename):
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+# 本地目录存储，适合单机部署
+class LocalStorage:
+    def __init__(self, root, accel_prefix=None):
+        self.root = root
+        self.accel_prefix = accel_prefix
+
+    def _path(self, key):
+        path = safe_join(self.root, key)
+        if path is None:
+            raise ValueError(f'非法的对象键：{key}')
+        return path
+
+    def setup(self):
+        os.makedirs(self.root, exist_ok=True)
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def size(self, key):
+        return os.path.getsize(self._path(key))
+
+    # 流式写入临时文件，写完再原子替换，其他请求不会读到写了一半的文件
+    def put(self, key, stream, content_type=None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{uuid.uuid4().hex}.part'
+        try:
+            with open(tmp_path, 'wb') as f:
+                shutil.copyfileobj(stream, f, STORAGE_CHUNK_SIZE)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    # 按块读取 [start, end] 字节区间（end 含在内，None 表示读到末尾）
+    def get(self, key, start=0, end=None):
+        f = open(self._path(key), 'rb')
+
+        def chunks():
+            with f:
+                f.seek(start)
+                remaining = None if end is None else end - start + 1
+                while remaining is None or remaining > 0:
+                    size = STORAGE_CHUNK_SIZE if remaining is None else min(STORAGE_CHUNK_SIZE, remaining)
+                    chunk = f.read(size)
+                    if not chunk:
+                        break
+                    if remaining is not None:
+                        remaining -= len(chunk)
+                    yield chunk
+        return chunks()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    # 本地文件没有可直接访问的地址
+    def url(self, key, expires):
+        return None
+
+    # send_from_directory 自带 Range 和条件请求处理；配置加速前缀时只回响应头，由 nginx 读取并发送文件
+    def send(self, key, mimetype=None):
+        if self.accel_prefix:
+            if not self.exists(key):
+                raise NotFound()
+            response = Response(mimetype=mimetype)
+            response.headers['X-Accel-Redirect'] = self.accel_prefix.rstrip('/') + '/' + quote(key)
+            return response
+        return send_from_directory(self.root, key, mimetype=mimetype)
+
+# S3兼容对象存储（AWS S3、MinIO 等），所有节点共享同一个桶，应用节点本身不保存文件
+# redirect 为真时播放请求重定向到预签名URL，浏览器直接向对象存储发Range请求
+class S3Storage:
+    def __init__(self, bucket, endpoint_url=None, region=None, access_key=None, secret_key=None, redirect=True):
+        import boto3  # 只有使用 s3 后端时才需要安装
+        from botocore.config import Config
+        from botocore.exceptions import ClientError
+        self.bucket = bucket
+        self.region = region
+        self.redirect = redirect
+        self.client_error = ClientError
+        self.client = boto3.client('s3', endpoint_url=endpoint_url, region_name=region,
+                                   aws_access_key_id=access_key, aws_secret_access_key=secret_key,
+                                   config=Config(signature_version='s3v4'))
+
+    def setup(self):
+        try:
+            self.client.head_bucket(Bucket=self.bucket)
+        except self.client_error:
+            if self.region and self.region != 'us-east-1':
+                self.client.create_bucket(Bucket=self.bucket,
+                                          CreateBucketConfiguration={'LocationConstraint': self.region})
+            else:
+                self.client.create_bucket(Bucket=self.bucket)
+
+    def _head(self, key):
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)
+        except self.client_error as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+    def exists(self, key):
+        return self._head(key) is not None
+
+    def size(self, key):
+        head = self._head(key)
+        if head is None:
+            raise FileNotFoundError(key)
+        return head['ContentLength']
+
+    # upload_fileobj 按块读取流，大文件自动走分段上传，不会整体读入内存
+    def put(self, key, stream, content_type=None):
+        extra = {'ContentType': content_type} if content_type else None
+        self.client.upload_fileobj(stream, self.bucket, key, ExtraArgs=extra)
+
+    def get(self, key, start=0, end=None):
+        if end is not None and end < start:
+            return iter(())
+        params = {'Bucket': self.bucket, 'Key': key}
+        if start or end is not None:
+            params['Range'] = f"bytes={start}-{'' if end is None else end}"
+        return self.client.get_object(**params)['Body'].iter_chunks(STORAGE_CHUNK_SIZE)
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def url(self, key, expires):
+        if not self.redirect:
+            return None
+        return self.client.generate_presigned_url('get_object', Params={'Bucket': self.bucket, 'Key': key},
+                                                  ExpiresIn=expires)
+
+    # 不重定向时由应用转发：按请求的 Range 只从对象存储读取需要的区间
+    def send(self, key, mimetype=None):
+        head = self._head(key)
+        if head is None:
+            raise NotFound()
+        size = head['ContentLength']
+        start, end, status = 0, size - 1, 200
+        # 只支持单个区间；多区间请求按 RFC 9110 忽略 Range，返回完整内容
+        byte_range = request.range
+        if byte_range is not None and byte_range.units == 'bytes' and len(byte_range.ranges) == 1:
+            span = byte_range.range_for_length(size)
+            if span is None:
+                return Response(status=416, headers={'Content-Range': f'bytes */{size}'})
+            start, end, status = span[0], span[1] - 1, 206
+        response = Response(self.get(key, start, end), status=status,
+                            mimetype=mimetype or head.get('ContentType'), direct_passthrough=True)
+        response.content_length = end - start + 1
+        response.headers['Accept-Ranges'] = 'bytes'
+        if status == 206:
+            response.headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+        return response
+
+# 根据 STORAGE_BACKEND 配置创建文件存储后端
+def make_storage(app):
+    backend = app.config['STORAGE_BACKEND']
+    if backend == 'local':
+        return LocalStorage(app.config['UPLOAD_FOLDER'], app.config['STORAGE_LOCAL_ACCEL_PREFIX'])
+    if backend == 's3':
+        return S3Storage(app.config['STORAGE_S3_BUCKET'], app.config['STORAGE_S3_ENDPOINT_URL'],
+                         app.config['STORAGE_S3_REGION'], app.config['STORAGE_S3_ACCESS_KEY'],
+                         app.config['STORAGE_S3_SECRET_KEY'], app.config['STORAGE_S3_REDIRECT'])
+    raise ValueError(f'未知的文件存储后端：{backend}')
+
+def get_storage():
+    return current_app.extensions['storage']
+
 # 装饰器，必须登录才能访问某些路由
 def login_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
         if 'user_id' not in session:
             flash('请先登录', 'danger')  # 提示用户先登录
-            return redirect(url_for('login'))  # 重定向登录页
+            return redirect(url_for('.login'))  # 重定向登录页
         return f(*args, **kwargs)
     return decorated
 
-# 获取当前登录用户对象
+# 获取当前登录用户对象，优先使用缓存
 def get_current_user():
     if 'user_id' in session:
-        return User.query.get(session['user_id'])
+        return current_app.extensions['user_cache'].get(session['user_id'])
     return None
 
-# 确保用户上传目录存在，返回路径
-def user_folder(username):
-    folder = os.path.join(app.config['UPLOAD_FOLDER'], username)
-    os.makedirs(folder, exist_ok=True)  # 不存在则创建目录
-    return folder
-
 # 生成随机5位验证码（大写字母和数字）
 def generate_captcha():
     choices = string.ascii_uppercase + string.digits
     return ''.join(random.choices(choices, k=5))
 
 # 供验证码页面访问，生成验证码并存session，简单纯文本返回
-@app.route('/captcha')
+@bp.route('/captcha')
 def captcha():
     code = generate_captcha()
     session['captcha'] = code.lower()  # 存小写方便比较，大小写不敏感
@@ -95,14 +734,14 @@ def captcha():
     return f"<div class='p-3 mb-3 bg-light text-success text-center' style='font-size:24px;letter-spacing:8px;font-weight:bold'>{code}</div>"
 
 # 主页，若登录跳到管理页，否则登录页
-@app.route('/')
+@bp.route('/')
 def index():
     if 'user_id' in session:
-        return redirect(url_for('manage'))
-    return redirect(url_for('login'))
+        return redirect(url_for('.manage'))
+    return redirect(url_for('.login'))
 
 # 注册路由，支持GET显示页面，POST处理注册
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         # 取表单参数并去除空白
@@ -113,15 +752,15 @@ def register():
         # 基础校验，用户名和密码不能为空
         if not username or not password:
             flash('用户名和密码不能为空', 'danger')
-            return redirect(url_for('register'))
+            return redirect(url_for('.register'))
         # 验证验证码是否正确（忽略大小写）
         if 'captcha' not in session or captcha_input != session['captcha']:
             flash('验证码错误', 'danger')
-            return redirect(url_for('register'))
+            return redirect(url_for('.register'))
         # 用户名是否已存在
         if User.query.filter_by(username=username).first():
             flash('用户名已存在', 'danger')
-            return redirect(url_for('register'))
+            return redirect(url_for('.register'))
 
         # 新建用户，设置密码哈希后写入数据库
         new_user = User(username=username)
@@ -132,12 +771,12 @@ def register():
 
         # 使用完验证码删除session中的验证码，防止重用
         session.pop('captcha', None)
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
     # GET请求直接渲染注册模板
     return render_template('register.html')
 
 # 登录路由，支持GET显示页面，POST处理登录
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         # 获取用户名密码验证码表单数据
@@ -149,30 +788,31 @@ def login():
         # 校验验证码，验证码必须存在且匹配
         if 'captcha' not in session or captcha_input != session['captcha']:
             flash('验证码错误', 'danger')
-            return redirect(url_for('login'))
+            return redirect(url_for('.login'))
         # 验证用户名密码，密码采用check_password_hash
         if not user or not user.check_password(password):
             flash('用户名或密码错误', 'danger')
-            return redirect(url_for('login'))
+            return redirect(url_for('.login'))
 
-        # 登录成功，保存user_id到session用于验证身份
+        # 登录成功，更换会话ID并保存user_id到session用于验证身份
+        session.regenerate()
         session['user_id'] = user.id
         flash(f'欢迎，{user.username}', 'success')
         session.pop('captcha', None)  # 使用完验证码即删除，防止重用
 
-        return redirect(url_for('manage'))
+        return redirect(url_for('.manage'))
     # GET请求渲染登录页面
     return render_template('login.html')
 
 # 登出路由，清除session并跳转到登录页
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     session.clear()  # 清除所有session数据，注销登录
     flash('已登出', 'info')
-    return redirect(url_for('login'))
+    return redirect(url_for('.login'))
 
 # 用户管理页面，支持上传视频和管理自己视频（重命名、删除、隐藏切换）
-@app.route('/manage', methods=['GET', 'POST'])
+@bp.route('/manage', methods=['GET', 'POST'])
 @login_required
 def manage():
     user = get_current_user()  # 获取当前登录用户
@@ -181,51 +821,49 @@ def manage():
     if request.method == 'POST':
         if 'video' not in request.files:
             flash('请选择上传文件', 'warning')
-            return redirect(url_for('manage'))
+            return redirect(url_for('.manage'))
 
         file = request.files['video']  # 获取上传文件
         title = request.form.get('title', '').strip()  # 视频标题，可选
 
         if file.filename == '':
             flash('请选择上传文件', 'warning')
-            return redirect(url_for('manage'))
+            return redirect(url_for('.manage'))
         if not allowed_file(file.filename):
             flash('仅支持mp4/avi/mov/mkv/webm等视频格式', 'warning')
-            return redirect(url_for('manage'))
+            return redirect(url_for('.manage'))
 
         # 标题未填时用文件名作为标题
         if not title:
             title = secure_filename(file.filename)
 
-        # 目录对应用户文件夹，自动创建
+        # 文件按“用户名/文件名”保存到存储后端
         filename = secure_filename(file.filename)
-        folder = user_folder(user.username)
-        save_path = os.path.join(folder, filename)
+        storage = get_storage()
 
         # 防止文件重名，追加编号
         basename, ext = os.path.splitext(filename)
         counter = 1
-        while os.path.exists(save_path):
+        while storage.exists(video_key(user.username, filename)):
             filename = f"{basename}_{counter}{ext}"
-            save_path = os.path.join(folder, filename)
             counter += 1
 
-        # 保存文件到磁盘
-        file.save(save_path)
+        # 边读上传流边写入存储后端
+        storage.put(video_key(user.username, filename), file.stream, video_mimetype(filename))
 
         # 记录数据库
         new_video = Video(filename=filename, title=title, visible=True, owner=user)
         db.session.add(new_video)
         db.session.commit()
         flash('上传成功', 'success')
-        return redirect(url_for('manage'))
+        return redirect(url_for('.manage'))
 
     # 查询用户所有视频用于渲染页面
     videos = Video.query.filter_by(user_id=user.id).all()
     return render_template('manage.html', videos=videos, username=user.username)
 
 # 删除视频请求处理，必须是视频所有者操作
-@app.route('/video/<int:video_id>/delete', methods=['POST'])
+@bp.route('/video/<int:video_id>/delete', methods=['POST'])
 @login_required
 def delete_video(video_id):
     user = get_current_user()
@@ -236,10 +874,8 @@ def delete_video(video_id):
         abort(403)  # 禁止访问
 
     try:
-        # 删除硬盘文件
-        path = os.path.join(user_folder(user.username), video.filename)
-        if os.path.exists(path):
-            os.remove(path)
+        # 删除存储后端中的文件
+        get_storage().delete(video_key(user.username, video.filename))
         # 删除数据库记录
         db.session.delete(video)
         db.session.commit()
@@ -247,10 +883,10 @@ def delete_video(video_id):
     except Exception as e:
         # 如果失败显示错误信息
         flash(f'删除失败：{e}', 'danger')
-    return redirect(url_for('manage'))
+    return redirect(url_for('.manage'))
 
 # 视频重命名，仅更新数据库标题
-@app.route('/video/<int:video_id>/rename', methods=['POST'])
+@bp.route('/video/<int:video_id>/rename', methods=['POST'])
 @login_required
 def rename_video(video_id):
     user = get_current_user()
@@ -266,10 +902,10 @@ def rename_video(video_id):
         flash('标题已更新', 'success')
     else:
         flash('标题不能为空', 'warning')
-    return redirect(url_for('manage'))
+    return redirect(url_for('.manage'))
 
 # 切换视频显示状态，公开/隐藏切换
-@app.route('/video/<int:video_id>/toggle_visibility', methods=['POST'])
+@bp.route('/video/<int:video_id>/toggle_visibility', methods=['POST'])
 @login_required
 def toggle_visibility(video_id):
     user = get_current_user()
@@ -281,10 +917,10 @@ def toggle_visibility(video_id):
     video.visible = not video.visible  # 取反切换状态
     db.session.commit()
     flash(f'视频状态已切换为{"公开" if video.visible else "隐藏"}', 'info')
-    return redirect(url_for('manage'))
+    return redirect(url_for('.manage'))
 
 # 查看指定用户公开视频列表
-@app.route('/user/<username>')
+@bp.route('/user/<username>')
 def view_user(username):
     user = User.query.filter_by(username=username).first_or_404()
     # 只显示公开视频
@@ -292,7 +928,7 @@ def view_user(username):
     return render_template('view_user.html', user=user, videos=videos)
 
 # 播放指定用户指定视频页面
-@app.route('/user/<username>/video/<int:video_id>')
+@bp.route('/user/<username>/video/<int:video_id>')
 def play_video(username, video_id):
     user = User.query.filter_by(username=username).first_or_404()
     video = Video.query.get_or_404(video_id)
@@ -301,21 +937,230 @@ def play_video(username, video_id):
     if video.user_id != user.id or not video.visible:
         abort(404)
 
-    folder = user_folder(user.username)
+    current_app.extensions['view_counter'].add(video.id)
     return render_template('play_video.html', video=video, username=username)
 
-# 静态发送视频文件接口，验证视频存在且公开才允许访问，防止访问隐藏视频
-@app.route('/user/<username>/video_file/<filename>')
+# 发送视频文件接口，验证视频存在且公开才允许访问，防止访问隐藏视频
+# 存储后端提供直连地址（预签名URL）时重定向过去，否则由后端按 Range 发送
+@bp.route('/user/<username>/video_file/<filename>')
 def serve_video(username, filename):
-    folder = user_folder(username)
     user = User.query.filter_by(username=username).first_or_404()
     video = Video.query.filter_by(user_id=user.id, filename=filename, visible=True).first()
     if not video:
         abort(404)
-    return send_from_directory(folder, filename)
+    storage = get_storage()
+    key = video_key(username, filename)
+    url = storage.url(key, current_app.config['STORAGE_URL_EXPIRES'])
+    if url:
+        return redirect(url)
+    return storage.send(key, video_mimetype(filename))
+
+# ---------- JSON API（/api/v1，请求头 Authorization: Bearer <令牌>） ----------
+VIDEO_FIELDS = ('id', 'title', 'filename', 'visible', 'user_id', 'username', 'url')
+DEFAULT_VIDEO_FIELDS = ('id', 'title', 'filename', 'visible', 'user_id', 'username', 'url')
+
+def api_error(status, message):
+    return jsonify(error=message), status
+
+def hash_token(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+# 装饰器，解析Bearer令牌，g.api_user_id 为令牌所属用户，未带令牌时为None（只能访问公开视频）
+def token_optional(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        g.api_user_id = None
+        g.api_token = None
+        header = request.headers.get('Authorization')
+        if header:
+            scheme, _, token = header.partition(' ')
+            api_token = None
+            if scheme.lower() == 'bearer' and token.strip():
+                api_token = ApiToken.query.filter_by(token_hash=hash_token(token.strip())).first()
+            if api_token is None:
+                return api_error(401, '访问令牌无效')
+            g.api_user_id = api_token.user_id
+            g.api_token = api_token
+        return f(*args, **kwargs)
+    return decorated
+
+# 解析 ?fields=a,b,c，未指定时返回默认字段
+def parse_fields(allowed, default):
+    raw = request.args.get('fields')
+    if not raw:
+        return default
+    fields = tuple(dict.fromkeys(f.strip() for f in raw.split(',') if f.strip()))
+    unknown = [f for f in fields if f not in allowed]
+    if unknown or not fields:
+        raise ValueError(f"未知字段：{', '.join(unknown)}，可选：{', '.join(allowed)}")
+    return fields
+
+def parse_int_arg(name, default=None, minimum=0, maximum=None):
+    raw = request.args.get(name)
+    if raw is None or raw == '':
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise ValueError(f'参数 {name} 必须是整数')
+    if value < minimum or (maximum is not None and value > maximum):
+        raise ValueError(f'参数 {name} 超出范围')
+    return value
+
+# 解析 ?ids=1,2,3，保持顺序并去重
+def parse_ids():
+    try:
+        ids = list(dict.fromkeys(int(i) for i in request.args['ids'].split(',') if i.strip()))
+    except ValueError:
+        raise ValueError('ids 必须是逗号分隔的整数')
+    if len(ids) > current_app.config['API_MAX_IDS']:
+        raise ValueError(f"ids 最多 {current_app.config['API_MAX_IDS']} 个")
+    return ids
+
+# 按主键游标分页，返回本页数据和下一页游标（没有更多时为None）
+def paginate(query, model, cursor, limit):
+    if cursor is not None:
+        query = query.filter(model.id > cursor)
+    items = query.order_by(model.id).limit(limit + 1).all()
+    next_cursor = str(items[limit - 1].id) if len(items) > limit else None
+    return items[:limit], next_cursor
+
+# 公开视频，或令牌用户自己的视频
+def video_visible_to(user_id):
+    if user_id is None:
+        return Video.visible.is_(True)
+    return db.or_(Video.visible.is_(True), Video.user_id == user_id)
+
+# 只加载所选字段需要的列，用户名一次IN查询批量取出，避免逐个视频查询所属用户
+def videos_to_dicts(videos, fields):
+    usernames = {}
+    if videos and ('username' in fields or 'url' in fields):
+        user_ids = {v.user_id for v in videos}
+        usernames = dict(db.session.query(User.id, User.username).filter(User.id.in_(user_ids)))
+    result = []
+    for v in videos:
+        data = {}
+        for field in fields:
+            if field == 'username':
+                data[field] = usernames[v.user_id]
+            elif field == 'url':
+                data[field] = url_for('.serve_video', username=usernames[v.user_id], filename=v.filename)
+            else:
+                data[field] = getattr(v, field)
+        result.append(data)
+    return result
+
+def video_query(fields):
+    columns = {'title', 'filename', 'visible', 'user_id'} & set(fields)
+    if 'username' in fields or 'url' in fields:
+        columns.add('user_id')
+    if 'url' in fields:
+        columns.add('filename')
+    return Video.query.options(load_only(*(getattr(Video, c) for c in columns or ('id',))))
+
+# 失败次数分别按客户端 IP 和用户名计数
+def login_throttle_keys(username):
+    return {f'ip:{request.remote_addr}': current_app.config['API_LOGIN_MAX_FAILURES_PER_IP'],
+            f'user:{username.lower()[:150]}': current_app.config['API_LOGIN_MAX_FAILURES']}
+
+# 窗口内失败次数达到上限时返回需要等待的秒数，否则返回 0
+def login_retry_after(keys):
+    now = time.time()
+    window = current_app.config['API_LOGIN_WINDOW']
+    rows = db.session.execute(db.select(LoginFailure).where(
+        LoginFailure.key.in_(list(keys)), LoginFailure.window_start > now - window)).scalars().all()
+    waits = [row.window_start + window - now for row in rows if row.failures >= keys[row.key]]
+    return int(max(waits)) + 1 if waits else 0
+
+# 累加失败次数，窗口过期的计数从 1 重新开始；记录保存在数据库中，多个工作进程共享
+def record_login_failure(keys):
+    now = time.time()
+    expired = LoginFailure.window_start <= now - current_app.config['API_LOGIN_WINDOW']
+    db.session.execute(db.delete(LoginFailure).where(expired))
+    for key in keys:
+        stmt = upsert(LoginFailure).values(key=key, failures=1, window_start=now)
+        stmt = stmt.on_conflict_do_update(index_elements=['key'], set_={
+            'failures': db.case((expired, 1), else_=LoginFailure.failures + 1),
+            'window_start': db.case((expired, now), else_=LoginFailure.window_start)})
+        db.session.execute(stmt)
+    db.session.commit()
+
+# 用户名密码换取访问令牌，令牌明文只在此返回一次；网页登录有验证码，这里按错误次数限流
+@bp.route('/api/v1/tokens', methods=['POST'])
+def api_create_token():
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return api_error(400, '请求体必须是 JSON 对象')
+    username = str(payload.get('username', '')).strip()
+    password = str(payload.get('password', '')).strip()
+    keys = login_throttle_keys(username)
+    retry_after = login_retry_after(keys)
+    if retry_after:
+        return jsonify(error='密码错误次数过多，请稍后再试'), 429, {'Retry-After': str(retry_after)}
+    user = User.query.filter_by(username=username).first()
+    if not user or not user.check_password(password):
+        record_login_failure(keys)
+        return api_error(401, '用户名或密码错误')
+    token = secrets.token_urlsafe(32)
+    db.session.add(ApiToken(user_id=user.id, token_hash=hash_token(token)))
+    db.session.commit()
+    return jsonify(token=token, user_id=user.id), 201
+
+# 注销当前令牌
+@bp.route('/api/v1/tokens/current', methods=['DELETE'])
+@token_optional
+def api_revoke_token():
+    if g.api_token is None:
+        return api_error(401, '缺少访问令牌')
+    db.session.delete(g.api_token)
+    db.session.commit()
+    return '', 204
+
+# ?ids=1,2,3 一次IN查询批量获取；否则按游标分页列出 ?username= 指定用户（默认令牌用户自己）的视频
+@bp.route('/api/v1/videos')
+@token_optional
+def api_list_videos():
+    try:
+        fields = parse_fields(VIDEO_FIELDS, DEFAULT_VIDEO_FIELDS)
+        if 'ids' in request.args:
+            ids = parse_ids()
+            found = {v.id: v for v in video_query(fields).filter(Video.id.in_(ids), video_visible_to(g.api_user_id))}
+            videos = [found[i] for i in ids if i in found]
+            return jsonify(data=videos_to_dicts(videos, fields), missing=[i for i in ids if i not in found])
+        cursor = parse_int_arg('cursor')
+        limit = parse_int_arg('limit', 20, 1, current_app.config['API_MAX_LIMIT'])
+    except ValueError as e:
+        return api_error(400, str(e))
+    username = request.args.get('username')
+    if username:
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            return api_error(404, '用户不存在')
+        user_id = user.id
+    elif g.api_user_id is not None:
+        user_id = g.api_user_id
+    else:
+        return api_error(400, '未登录时必须指定 username')
+    query = video_query(fields).filter(Video.user_id == user_id)
+    if user_id != g.api_user_id:
+        query = query.filter(Video.visible.is_(True))
+    videos, next_cursor = paginate(query, Video, cursor, limit)
+    return jsonify(data=videos_to_dicts(videos, fields), next_cursor=next_cursor)
+
+@bp.route('/api/v1/videos/<int:video_id>')
+@token_optional
+def api_get_video(video_id):
+    try:
+        fields = parse_fields(VIDEO_FIELDS, DEFAULT_VIDEO_FIELDS)
+    except ValueError as e:
+        return api_error(400, str(e))
+    video = video_query(fields).filter(Video.id == video_id, video_visible_to(g.api_user_id)).first()
+    if video is None:
+        return api_error(404, '视频不存在或无权访问')
+    return jsonify(data=videos_to_dicts([video], fields)[0])
 
 # 用户搜索，依据输入关键字与用户名最长公共子序列长度降序排列
-@app.route('/search', methods=['GET', 'POST'])
+@bp.route('/search', methods=['GET', 'POST'])
 @login_required
 def search():
     results = []
@@ -337,13 +1182,197 @@ def search():
                 flash('没有匹配结果', 'warning')
     return render_template('search.html', results=results, query=query)
 
-# 在请求第一次调用前创建数据库和上传目录
-@app.before_first_request
+# ---------- 发现页：播放计数缓冲与排行表 ----------
+# 返回支持 ON CONFLICT 的 INSERT，SQLite 与 PostgreSQL 的写法相同
+def upsert(model):
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
+# 把 {video_id: 次数} 一次性累加到当前小时的计数行
+@timed('flush_views')
+def flush_views(counts):
+    hour = int(time.time() // 3600)
+    stmt = upsert(VideoViewBucket)
+    stmt = stmt.on_conflict_do_update(index_elements=['video_id', 'hour'],
+                                      set_={'views': VideoViewBucket.views + stmt.excluded.views})
+    db.session.execute(stmt, [{'video_id': k, 'hour': hour, 'views': v} for k, v in counts.items()])
+    db.session.commit()
+
+# 距上次重算不足 min_interval 秒时返回 False；否则更新 feed_state 占住本轮重算
+# 条件 UPDATE 持有行锁直到提交，并发的进程或定时任务会等待后看到新时间，因而跳过或排队执行
+def claim_feed_refresh(min_interval):
+    now = time.time()
+    refreshed_at = db.session.execute(db.select(FeedState.refreshed_at).where(FeedState.id == 1)).scalar()
+    if refreshed_at is not None and refreshed_at > now - min_interval:
+        return False
+    db.session.execute(upsert(FeedState).values(id=1, refreshed_at=0).on_conflict_do_nothing())
+    claimed = db.session.execute(db.update(FeedState).where(
+        FeedState.id == 1, FeedState.refreshed_at <= now - min_interval).values(refreshed_at=now)).rowcount
+    if not claimed:
+        db.session.rollback()
+    return bool(claimed)
+
+# 清理过期计数，重算热门与最新榜单并整体替换排行表；min_interval 秒内已有其他进程重算过时直接返回 False
+@timed('refresh_feed')
+def refresh_feed(min_interval=0):
+    size = current_app.config['FEED_SIZE']
+    since = int(time.time() // 3600) - current_app.config['FEED_WINDOW_HOURS']
+    if not claim_feed_refresh(min_interval):
+        return False
+    db.session.execute(db.delete(VideoViewBucket).where(VideoViewBucket.hour <= since))
+    views = db.func.sum(VideoViewBucket.views).label('views')
+    popular = db.session.execute(
+        db.select(VideoViewBucket.video_id, views)
+        .join(Video, Video.id == VideoViewBucket.video_id).where(Video.visible)
+        .group_by(VideoViewBucket.video_id).order_by(views.desc(), VideoViewBucket.video_id.desc()).limit(size)).all()
+    recent = db.session.execute(
+        db.select(Video.id).where(Video.visible).order_by(Video.id.desc()).limit(size)).scalars().all()
+    recent_views = dict(db.session.execute(
+        db.select(VideoViewBucket.video_id, views)
+        .where(VideoViewBucket.video_id.in_(recent)).group_by(VideoViewBucket.video_id)).all()) if recent else {}
+    rows = [{'feed': 'popular', 'position': i, 'video_id': video_id, 'views': count}
+            for i, (video_id, count) in enumerate(popular)]
+    rows += [{'feed': 'recent', 'position': i, 'video_id': video_id, 'views': recent_views.get(video_id, 0)}
+             for i, video_id in enumerate(recent)]
+    db.session.execute(db.delete(FeedEntry))
+    if rows:
+        db.session.execute(db.insert(FeedEntry), rows)
+    db.session.commit()
+    return True
+
+# 一次按主键顺序读出两个榜单，联表过滤掉已删除或已隐藏的视频
+def load_feed():
+    feed = {'popular': [], 'recent': []}
+    rows = db.session.execute(
+        db.select(FeedEntry.feed, FeedEntry.views, Video.id, Video.title, User.username)
+        .join(Video, Video.id == FeedEntry.video_id).join(User, User.id == Video.user_id)
+        .where(Video.visible).order_by(FeedEntry.feed, FeedEntry.position)).all()
+    for name, views, video_id, title, username in rows:
+        feed[name].append({'video_id': video_id, 'title': title, 'username': username, 'views': views})
+    return feed
+
+# 播放次数先在内存中累加，后台线程每隔 VIEW_FLUSH_INTERVAL 秒批量写入，并按 FEED_REFRESH_INTERVAL 刷新排行表
+class ViewCounter:
+    def __init__(self, app):
+        self.app = app
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = None
+
+    def add(self, video_id):
+        with self._lock:
+            self._counts[video_id] += 1
+            self._start()
+
+    def start(self):
+        with self._lock:
+            self._start()
+
+    def _start(self):
+        if self._thread is None:
+            self._stopped = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(self._stopped,), daemon=True)
+            self._thread.start()
+            atexit.register(self._flush_at_exit)
+
+    # 停止后台线程并写入剩余计数，之后不再在解释器退出时写库（数据库所在目录可能已被删除）
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._stopped.set()
+                atexit.unregister(self._flush_at_exit)
+        if thread is not None:
+            thread.join()
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+        if not counts:
+            return
+        with self.app.app_context():
+            try:
+                flush_views(counts)
+            except Exception:
+                db.session.rollback()
+                with self._lock:
+                    self._counts.update(counts)  # 写入失败时放回缓冲区，下一轮重试
+                raise
+
+    def _run(self, stopped):
+        while not stopped.wait(self.app.config['VIEW_FLUSH_INTERVAL']):
+            try:
+                self.flush()
+                interval = self.app.config['FEED_REFRESH_INTERVAL']
+                if interval:
+                    with self.app.app_context():
+                        refresh_feed(interval)
+            except Exception:
+                self.app.logger.exception('写入播放计数或刷新排行表失败')
+
+    def _flush_at_exit(self):
+        try:
+            self.flush()
+        except Exception:
+            self.app.logger.exception('退出时写入播放计数失败')
+
+# 发现页，公开视频的热门与最新榜单，只读物化的排行表
+@bp.route('/discover')
+def discover():
+    current_app.extensions['view_counter'].start()
+    return render_template('discover.html', feed=load_feed())
+
+# 创建数据库表、会话表和文件存储（本地目录或对象存储桶），需在应用上下文中调用
 def init_db():
     db.create_all()
-    if not os.path.exists(app.config['UPLOAD_FOLDER']):
-        os.makedirs(app.config['UPLOAD_FOLDER'])
+    current_app.session_interface.store.setup()
+    get_storage().setup()
+
+# 命令行建表：flask --app app init-db（首次部署或新增数据表后执行一次，应用启动时不再自动建表）
+@bp.cli.command('init-db')
+def init_db_command():
+    init_db()
+    click.echo('数据库表和文件存储已创建')
+
+# 命令行重算发现页排行表：flask --app app refresh-feed（FEED_REFRESH_INTERVAL 为 0 时由 cron 定时执行）
+@bp.cli.command('refresh-feed')
+def refresh_feed_command():
+    refresh_feed()
+    click.echo('排行表已刷新')
+
+# 预先编译全部页面模板，Jinja 会缓存编译结果
+def warm_up_templates(app):
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+# 应用工厂：默认配置 < FLASK_ 前缀的环境变量（如 FLASK_UPLOAD_FOLDER）< config 参数
+# 不建表、不创建目录，工作进程创建后即可开始服务
+def create_app(config=None):
+    app = Flask(__name__)
+    app.config.update(DEFAULT_CONFIG)
+    app.config.from_prefixed_env()
+    if config:
+        app.config.update(config)
+    db.init_app(app)
+    app.session_interface = ServerSideSessionInterface(make_session_store(app))
+    app.extensions['user_cache'] = UserCache()
+    app.extensions['storage'] = make_storage(app)
+    app.extensions['view_counter'] = ViewCounter(app)
+    before_render_template.connect(start_template_timer, app)
+    template_rendered.connect(record_template_timer, app)
+    app.register_blueprint(bp)
+    if app.config['WARMUP']:
+        threading.Thread(target=warm_up_templates, args=(app,), daemon=True).start()
+    return app
 
-# 启动flask应用，debug模式启用
+# 启动flask开发服务器；生产环境请用 WSGI 服务器加载 app:create_app()
 if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        init_db()
     app.run(debug=False)